@@ -3,21 +3,25 @@ import sqlite3
 import os
 import subprocess # For running git log
 import zipfile
-import io
 import datetime # For timestamp in zip filename
-import shutil # Import shutil for file copying
+import tempfile # Snapshots of the live database for downloads
+import sys # sys.maxunicode for prefix range bounds
+import stat # For checking stat() results without extra syscalls
+import string # ASCII letter tables for NOCASE prefix bounds
+import threading # For the per-thread SQLite connection pool
+from functools import lru_cache # For caching rendered changelog notes
 from flask import Flask, render_template, request, g, send_file, abort, flash, redirect, url_for, current_app, Response # Add flash, redirect, url_for, current_app
-from collections import Counter
-import math # For tag cloud scaling
 import logging
 import re # For parsing git log
 import glob # For globbing file patterns
 import markdown # Import the markdown library
 from logging.handlers import RotatingFileHandler # Import handler
 import ast # <-- Add import for Abstract Syntax Trees
+from db_schema import FTS_TABLE, ensure_fts_schema, ensure_search_indexes, has_fts_table, migrate_database # Shared schema/migrations
+from thumbnails import generate_thumbnail, get_thumbnail_pool # Thumbnail rendering (runs in worker processes too)
 
 # --- Add Pillow import ---
-from PIL import Image, UnidentifiedImageError
+from PIL import UnidentifiedImageError, features
 
 # --- Logger Setup ---
 # Moved from bottom to ensure logger is available globally at startup
@@ -58,11 +62,24 @@ if len(app.logger.handlers) > 1:
     app.logger.removeHandler(app.logger.handlers[0])
 
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', os.urandom(24)) # Use env var or random
+# Let a front-end server (Apache mod_xsendfile, lighttpd) send files named in an X-Sendfile header.
+# Off by default: without such a proxy in front of Gunicorn, responses would have empty bodies.
+app.config['USE_X_SENDFILE'] = os.environ.get('DENKRAUM_USE_X_SENDFILE', '0') == '1'
 
 # Set other default config values (can be overridden by instance config or tests)
 app.config.setdefault('BACKUP_DIR', 'backups')
 app.config.setdefault('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+app.config.setdefault('SEARCH_RESULTS_PER_PAGE', 50) # Rows fetched and rendered per results page
 app.config.setdefault('THUMBNAIL_SIZE', (100, 100)) # Width, Height
+app.config.setdefault('THUMBNAIL_MAX_AGE', 86400) # Browser cache lifetime (s); revalidated via ETag afterwards
+app.config.setdefault('THUMBNAIL_WORKERS', int(os.environ.get('DENKRAUM_THUMBNAIL_WORKERS', 0))) # >0: render in a process pool
+
+# --- Precompiled Patterns ---
+VERSION_TAG_RE = re.compile(r'^v?(\d+\.\d+\.\d+)$') # v1.2.3 or 1.2.3 -> 1.2.3
+CHANGELOG_HEADING_RE = re.compile(r'^##\s.*?\[v?([^\]]+)\]') # "## [v]X.Y.Z] - date" -> X.Y.Z
+WORD_CHAR_RE = re.compile(r'[^\W_]') # Letters/digits; unicode61 splits on everything else ('_' too), so terms without them go to LIKE
+HTML_ID_UNSAFE_RE = re.compile(r'[^a-zA-Z0-9-]')
+THUMBNAIL_NAME_UNSAFE_RE = re.compile(r'[^a-zA-Z0-9_.-]')
 
 # --- Menu Parsing --- 
 MENU_FILE = 'menu.md'
@@ -127,30 +144,96 @@ def before_request():
             logger.error(f"Error generating URL for endpoint '{item.get('endpoint')}': {e}")
             # Optionally skip this item or add a placeholder
             # g.main_menu.append({'text': item.get('text', 'Error'), 'url': '#'})
-    logger.debug(f"Menu with URLs generated for request: {g.main_menu}")
+    logger.debug("Menu with URLs generated for request: %s", g.main_menu)
 # --- End Menu Parsing ---
 
 # --- Database Handling ---
 
+# --- Connection Pool ---
+# The web app only reads the index, so each worker thread keeps one long-lived
+# connection per database file instead of reconnecting (and re-parsing the
+# schema) on every request. A connection is only ever used (and closed) by
+# the thread that opened it.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL", # Readers don't block the indexer (and vice versa)
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=1073741824", # Map up to 1 GB; file-backed, so shared by all connections/workers
+    "PRAGMA cache_size=-65536", # 64 MB page cache (private heap per connection, so kept modest)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA query_only=1", # Set last: switching to WAL above needs write access
+)
+
+_db_pool = threading.local()
+
+def _open_pooled_connection(db_path):
+    """Opens a connection and applies the pool PRAGMAs. Schema migrations are not run here;
+       the indexer and `python db_schema.py` (run before the server starts) take care of them."""
+    logger.debug("Opening pooled database connection: %s", db_path)
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row # Return rows as dictionary-like objects
+    for pragma in SQLITE_PRAGMAS:
+        try:
+            db.execute(pragma)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not apply '{pragma}' to {db_path}: {e}")
+    return db
+
+def _check_fts(db):
+    """Returns True if the database behind db has the FTS5 index."""
+    try:
+        return has_fts_table(db)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not check for the full-text index: {e}")
+        return False
+
+def get_pooled_connection(db_path):
+    """Returns (connection, fts_enabled) for db_path from the current thread's pool."""
+    connections = getattr(_db_pool, 'connections', None)
+    if connections is None:
+        connections = _db_pool.connections = {}
+    inode = os.stat(db_path).st_ino
+    entry = connections.get(db_path)
+    # Reopen if the file was replaced (e.g. a new database dropped in by a deploy)
+    if entry is None or entry[2] != inode:
+        if entry is not None:
+            _discard_pooled_connection(entry[0], db_path) # Don't leak the connection to the replaced file
+        stamp = _db_stamp(db_path)
+        db = _open_pooled_connection(db_path)
+        entry = connections[db_path] = (db, _check_fts(db), inode, stamp)
+    elif not entry[1]:
+        # No FTS index yet: look again once the database changes (migration run or restore)
+        stamp = _db_stamp(db_path)
+        if stamp != entry[3]:
+            entry = connections[db_path] = (entry[0], _check_fts(entry[0]), inode, stamp)
+    return entry[0], entry[1]
+
+def _discard_pooled_connection(db, db_path):
+    """Closes a pooled connection of the current thread."""
+    try:
+        db.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Error closing pooled connection to {db_path}: {e}")
+
 def get_db():
-    """Opens a new database connection if there is none yet for the current application context."""
-    db = getattr(g, '_database', None)
+    """Returns the current thread's pooled connection, cached on the app context."""
+    db = g.get('_database')
     if db is None:
         db_path = current_app.config['DATABASE'] # Use config from current app context
         if not os.path.exists(db_path):
              logger.error(f"Database file '{db_path}' not found. Run indexer first.")
              raise FileNotFoundError(f"Database file '{db_path}' not found. Run indexer first.")
-        logger.debug(f"Connecting to database: {db_path}") # Add log for debugging
-        db = g._database = sqlite3.connect(db_path)
-        db.row_factory = sqlite3.Row # Return rows as dictionary-like objects
+        db, g._fts_enabled = get_pooled_connection(db_path)
+        g._database = db
     return db
 
-@app.teardown_appcontext
-def close_connection(exception):
-    """Closes the database again at the end of the request."""
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+def fts_enabled():
+    """Returns True if the current database connection has the FTS5 index available."""
+    get_db()
+    return g.get('_fts_enabled', False)
+
+def fts_phrase(term):
+    """Quotes a user term as an FTS5 prefix phrase (e.g. sap.m.Button -> "sap.m.Button"*)."""
+    return '"' + term.replace('"', '""') + '"*'
 
 def query_db(query, args=(), one=False):
     """Helper function to query the database."""
@@ -159,6 +242,51 @@ def query_db(query, args=(), one=False):
     cur.close()
     return (rv[0] if rv else None) if one else rv
 
+# --- Metadata Cache ---
+# Dropdown values and the tag cloud only change when the indexer (or a restore)
+# writes the database, so they are memoized per DB file and invalidated when the
+# file's mtime/size stamp changes.
+_meta_cache = {}
+
+def _db_stamp(db_path):
+    """Change marker for the database file (includes the WAL file, if any)."""
+    stamp = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def cached_db_query(key, fn):
+    """Returns fn() memoized per database until the database file changes."""
+    db_path = current_app.config['DATABASE']
+    stamp = _db_stamp(db_path)
+    cached = _meta_cache.get((db_path, key))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    result = fn()
+    _meta_cache[(db_path, key)] = (stamp, result)
+    return result
+
+# --- File Cache ---
+# Values derived from a single file (rendered markdown, parsed CHANGELOG.md and test
+# files), memoized per (path, key) until the file's mtime/size stamp changes.
+_file_cache = {}
+
+def cached_by_file(path, key, fn):
+    """Returns fn() memoized until the file at path changes.
+       Raises FileNotFoundError if the file is missing."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _file_cache.get((path, key))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    result = fn()
+    _file_cache[(path, key)] = (stamp, result)
+    return result
+
 def get_distinct_file_types():
     """Queries the database for distinct, non-empty file types."""
     # Order them for consistent display
@@ -173,30 +301,60 @@ def get_distinct_years():
     # Keep as int for comparison
     return [row['category_year'] for row in rows]
 
-def search_database(filename=None, years=None, file_types=None, keywords=None):
-    """Performs the search query based on provided criteria."""
+def filename_prefix(filename):
+    """Returns the prefix for a 'starts-with' filename search ('report*'), else None."""
+    if filename.endswith('*'):
+        prefix = filename[:-1]
+        if prefix and not any(c in prefix for c in '*?['): # Glob wildcards; % and _ are compared literally
+            return prefix
+    return None
+
+SQLITE_MAX_INTEGER = 2**63 - 1 # Larger Python ints raise OverflowError when bound as parameters
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase) # What COLLATE NOCASE folds
+
+def nocase_prefix_bounds(prefix):
+    """(lower, upper) bounds such that, under COLLATE NOCASE, exactly the strings starting with
+       prefix (ignoring ASCII case) satisfy lower <= s < upper, or None if there is no such upper
+       bound (prefix ends in the last code point)."""
+    lower = prefix.translate(ASCII_LOWER)
+    if ord(lower[-1]) == sys.maxunicode:
+        return None
+    last = chr(ord(lower[-1]) + 1)
+    if last == 'A':
+        last = '[' # 'A'-'Z' sort as 'a'-'z' under NOCASE, so '[' is what follows '@'
+    elif last == '\ud800':
+        last = '\ue000' # Surrogates can't be encoded as UTF-8; U+E000 is the next valid code point
+    return lower, lower[:-1] + last
+
+def like_contains(term):
+    """LIKE pattern matching term anywhere, with %, _ and \\ taken literally (use with ESCAPE '\\')."""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def search_database(filename=None, years=None, file_types=None, keywords=None, limit=None, offset=0):
+    """Performs the search query based on provided criteria.
+       With a limit, only that many rows (starting at offset) are fetched."""
     # Renamed year to years (plural)
-    base_query = "SELECT path, filename, category_type, category_year, summary, keywords FROM files WHERE 1=1"
+    if not (filename or years or file_types or keywords):
+        return [] # Nothing to search for; don't touch SQLite
+
+    columns = "files.path, files.filename, files.category_type, files.category_year, files.summary, files.keywords"
+    # Conditions are built cheapest first: integer/indexed filters, then text predicates
     conditions = []
     params = []
 
-    if filename:
-        conditions.append("filename LIKE ?")
-        params.append(f"%{filename}%")
-
     # Handle single or multiple years
     if years: # Check if the list is not empty
-        try:
-            # Ensure years are integers
-            year_ints = [int(y) for y in years if y] 
-            if year_ints:
-                placeholders = ', '.join('?' * len(year_ints))
-                conditions.append(f"category_year IN ({placeholders})")
-                params.extend(year_ints)
-        except ValueError:
-            # Handle invalid year input gracefully (e.g., ignore or show error)
-            print(f"Warning: Invalid year value encountered in {years}") # Log warning
-            pass 
+        # Ensure years are integers; the set drops repeats so the IN list stays minimal
+        year_strs = [str(y).strip() for y in years if y]
+        year_ints = sorted({int(y) for y in year_strs if y.isdecimal()})
+        if not all(y.isdecimal() for y in year_strs):
+            # Invalid values are skipped individually instead of dropping the whole year filter
+            logger.warning(f"Invalid year value encountered in {years}")
+        if year_ints:
+            placeholders = ', '.join('?' * len(year_ints))
+            conditions.append(f"files.category_year IN ({placeholders})")
+            params.extend(year_ints)
 
     # Handle single or multiple file types
     if file_types: # Check if the list is not empty
@@ -206,61 +364,90 @@ def search_database(filename=None, years=None, file_types=None, keywords=None):
         
         # Create placeholders for the IN clause
         placeholders = ', '.join('?' * len(file_types))
-        conditions.append(f"category_type IN ({placeholders})")
+        conditions.append(f"files.category_type IN ({placeholders})")
         params.extend(file_types)
 
+    use_fts = fts_enabled()
+    fts_clauses = [] # Combined into a single `files_fts MATCH ?` expression
+
+    if filename:
+        prefix = filename_prefix(filename)
+        bounds = nocase_prefix_bounds(prefix) if prefix else None
+        if bounds:
+            # Case-insensitive index range scan on idx_files_filename_nocase instead of a full LIKE scan
+            conditions.append("files.filename COLLATE NOCASE >= ? AND files.filename COLLATE NOCASE < ?")
+            params.extend(bounds)
+        elif use_fts and WORD_CHAR_RE.search(filename):
+            fts_clauses.append(f"filename : {fts_phrase(filename)}")
+        else:
+            conditions.append("files.filename LIKE ? ESCAPE '\\'")
+            params.append(like_contains(filename))
+
     if keywords:
         keyword_list = [kw.strip() for kw in keywords.split(',') if kw.strip()]
         keyword_conditions = []
         for kw in keyword_list:
-            keyword_conditions.append("(keywords LIKE ? OR summary LIKE ? OR filename LIKE ?)") # Also check filename
-            params.extend([f"%{kw}%", f"%{kw}%", f"%{kw}%"])
+            if use_fts and WORD_CHAR_RE.search(kw):
+                # Unqualified phrase matches filename, summary or keywords
+                fts_clauses.append(fts_phrase(kw))
+            else:
+                keyword_conditions.append("(files.keywords LIKE ? ESCAPE '\\' OR files.summary LIKE ? ESCAPE '\\' OR files.filename LIKE ? ESCAPE '\\')") # Also check filename
+                pattern = like_contains(kw)
+                params.extend([pattern, pattern, pattern])
         if keyword_conditions:
             conditions.append(f"({' AND '.join(keyword_conditions)})")
 
-    # Only execute query if there are actual conditions beyond WHERE 1=1
+    from_clause = "files"
+    order_by = "files.last_modified DESC" # Order by date
+    if fts_clauses:
+        # Inverted-index lookup instead of scanning every row with LIKE. CROSS JOIN pins the
+        # join order: SQLite always drives from the FTS matches, even if statistics make a
+        # year/type index look cheaper (which would re-evaluate MATCH row by row)
+        from_clause = f"{FTS_TABLE} CROSS JOIN files ON files.id = {FTS_TABLE}.rowid"
+        conditions.append(f"{FTS_TABLE} MATCH ?")
+        params.append(' AND '.join(fts_clauses))
+        order_by = f"bm25({FTS_TABLE}), files.last_modified DESC" # Best matches first
+
+    # Only execute query if there are actual conditions (e.g. not just invalid years)
     if conditions:
-        sql_query = f"{base_query} AND {' AND '.join(conditions)} ORDER BY last_modified DESC" # Order by date
+        sql_query = f"SELECT {columns} FROM {from_clause} WHERE {' AND '.join(conditions)} ORDER BY {order_by}"
+        if limit is not None:
+            sql_query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
         try:
              results = query_db(sql_query, params)
              return results
         except sqlite3.Error as e:
-            print(f"Database search error: {e}") # Log this properly in a real app
+            logger.error(f"Database search error: {e}")
             return [] # Return empty list on error
     else:
         # Maybe return recent files or show a message?
         return []
 
+# Splits the comma-separated `keywords` column into one row per keyword and counts
+# them inside SQLite. lower() only folds ASCII, but the indexer already stores
+# keywords lower-cased (extract_keywords), so results match the previous Python-side count.
+TOP_KEYWORDS_SQL = """
+    WITH RECURSIVE split(word, rest) AS (
+        SELECT '', keywords || ',' FROM files WHERE keywords IS NOT NULL AND keywords != ''
+        UNION ALL
+        SELECT lower(trim(substr(rest, 1, instr(rest, ',') - 1), ' \t\r\n')),
+               substr(rest, instr(rest, ',') + 1)
+        FROM split WHERE rest != ''
+    )
+    SELECT word, COUNT(*) AS cnt FROM split WHERE word != ''
+    GROUP BY word ORDER BY cnt DESC, word LIMIT ?
+"""
+
 def get_top_keywords(limit=50):
-    """Fetches keywords row by row and returns the most frequent ones."""
-    logger.debug("[get_top_keywords] Fetching keywords row by row...")
-    keyword_counts = Counter()
-    conn = get_db()
-    cur = conn.cursor()
+    """Returns the most frequent keywords as (keyword, count) tuples, aggregated in SQL."""
+    logger.debug("[get_top_keywords] Aggregating keywords in SQLite...")
     try:
-        cur.execute("SELECT keywords FROM files WHERE keywords IS NOT NULL AND keywords != ''")
-        # Fetch and process row by row to reduce memory load
-        row_count = 0
-        while True:
-            row = cur.fetchone() # Fetch one row
-            if row is None:
-                break # No more rows
-            row_count += 1
-            if row['keywords']:
-                keywords = row['keywords'].split(',')
-                # Increment count for each keyword
-                for keyword in keywords:
-                    clean_keyword = keyword.strip().lower() # Normalize
-                    if clean_keyword:
-                        keyword_counts[clean_keyword] += 1
-        logger.debug(f"[get_top_keywords] Processed {row_count} rows.")
+        rows = query_db(TOP_KEYWORDS_SQL, (limit,))
     except sqlite3.Error as e:
-        logger.error(f"[get_top_keywords] Database error while fetching keywords: {e}")
-    finally:
-        if cur:
-            cur.close() # Ensure cursor is closed
-    # Get the top N keywords
-    most_common = keyword_counts.most_common(limit)
+        logger.error(f"[get_top_keywords] Database error while counting keywords: {e}")
+        return []
+    most_common = [(row['word'], row['cnt']) for row in rows]
     logger.debug(f"[get_top_keywords] Top {limit} keywords found: {most_common}")
     return most_common
 
@@ -278,11 +465,19 @@ def create_backup():
     backup_path = os.path.join(backup_dir, backup_filename)
 
     try:
-        shutil.copy2(db_path, backup_path) # copy2 preserves metadata
+        # SQLite online backup: a consistent snapshot (incl. WAL frames) even if a writer
+        # such as the indexer is mid-transaction, unlike a plain file copy
+        dest = sqlite3.connect(backup_path)
+        try:
+            get_db().backup(dest)
+        finally:
+            dest.close()
         logger.info(f"Database backup created: {backup_path}")
         return backup_path
     except Exception as e:
         logger.error(f"Failed to create database backup to {backup_dir}: {e}")
+        if os.path.exists(backup_path):
+            os.remove(backup_path) # Don't leave a partial backup behind
         return None
 
 @app.route('/backup', methods=['POST'])
@@ -316,18 +511,35 @@ def index():
     else: # request.method == 'GET'
         # Get data from URL parameters (e.g., from tag cloud links)
         filename = request.args.get('filename')
-        year_single = request.args.get('year') 
-        file_type_single = request.args.get('type') 
         keywords = request.args.get('keywords')
+        # Repeated year/type parameters come from the pagination links
         # Filter out potential empty strings here too for consistency
-        selected_years = [year_single] if year_single else []
-        selected_types = [file_type_single] if file_type_single else []
+        selected_years = [y for y in request.args.getlist('year') if y]
+        selected_types = [t for t in request.args.getlist('type') if t]
         search_terms = {'filename': filename, 'year': selected_years, 'type': selected_types, 'keywords': keywords}
 
     # Perform search if any search term is provided (from POST or GET)
     # Note: search_terms['year'] and ['type'] are now lists
-    if any(st for key, st in search_terms.items() if st): # Check for non-empty values/lists
-        results_raw = search_database(filename=filename, years=selected_years, file_types=selected_types, keywords=keywords)
+    has_query = any(search_terms.values()) # Check for non-empty values/lists
+    pagination = None
+    if has_query:
+        per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+        try:
+            page = max(1, int(request.values.get('page', 1)))
+        except ValueError:
+            page = 1
+        page = min(page, SQLITE_MAX_INTEGER // per_page) # Keep OFFSET within SQLite's 64-bit INTEGER
+        # One extra row tells us whether a next page exists, without a COUNT(*) query
+        results_raw = search_database(filename=filename, years=selected_years, file_types=selected_types,
+                                      keywords=keywords, limit=per_page + 1, offset=(page - 1) * per_page)
+        has_next = len(results_raw) > per_page
+        results_raw = results_raw[:per_page]
+        pagination = {
+            'first': (page - 1) * per_page + 1,
+            'last': (page - 1) * per_page + len(results_raw),
+            'prev_url': url_for('index', page=page - 1, **search_terms) if page > 1 else None,
+            'next_url': url_for('index', page=page + 1, **search_terms) if has_next else None,
+        }
         # Process results to add relative paths
         base_dir = os.path.abspath(current_app.config['INDEXED_ROOT_DIR'])
         results = []
@@ -348,15 +560,12 @@ def index():
          pass
 
     # Get distinct file types for the dropdown
-    distinct_types = get_distinct_file_types()
+    distinct_types = cached_db_query('distinct_types', get_distinct_file_types)
     # Get distinct years for the dropdown
-    distinct_years = get_distinct_years()
-    # Get top keywords for the tag cloud (this might be slow for large datasets)
-    top_keywords = get_top_keywords()
-    # print(f"DEBUG: Top Keywords Data (first 5): {top_keywords[:5]}") # Add this debug print
-
-    # *** ADD LOGGING HERE ***
-    logger.info(f"[Route: /] Value of main_menu being passed to template: {g.main_menu}")
+    distinct_years = cached_db_query('distinct_years', get_distinct_years)
+    # Get top keywords for the tag cloud (cached; recomputed only when the DB changes)
+    top_keywords = cached_db_query('top_keywords', get_top_keywords)
+    logger.debug("[Route: /] Value of main_menu being passed to template: %s", g.main_menu)
 
     # Define page sections for floating nav
     page_nav_items = []
@@ -372,8 +581,25 @@ def index():
                            top_keywords=top_keywords,
                            distinct_types=distinct_types,
                            distinct_years=distinct_years,
+                           pagination=pagination,
                            page_nav_items=page_nav_items) # Pass nav items
 
+# --- Path Safety ---
+@lru_cache(maxsize=32)
+def _real_root(root_abs):
+    """Symlink-resolved form of a configured root directory (cached per config value)."""
+    return os.path.realpath(root_abs)
+
+def safe_join_path(root, rel_path):
+    """Joins rel_path onto root and returns the normalized absolute path, or None if
+       the result (after resolving symlinks) would lie outside root."""
+    root_abs = root if os.path.isabs(root) else os.path.abspath(root) # Relative roots follow the cwd
+    candidate = os.path.normpath(os.path.join(root_abs, rel_path))
+    real_root = _real_root(root_abs)
+    if os.path.commonpath([real_root, os.path.realpath(candidate)]) != real_root:
+        return None
+    return candidate
+
 @app.route('/download/') # Note the trailing slash
 @app.route('/download/<path:file_path>')
 def download_file(file_path=None):
@@ -381,17 +607,12 @@ def download_file(file_path=None):
     if not file_path:
         abort(404) # No file path provided
 
-    # --- Security Check (Revised based on serve_thumbnail logic) ---
-    # 1. Get the absolute path of the configured root directory
-    indexed_root_abs = os.path.abspath(current_app.config['INDEXED_ROOT_DIR'])
-    
-    # 2. Join the requested file_path with the root directory and then normalize
-    requested_path = os.path.join(indexed_root_abs, file_path)
-    safe_path = os.path.abspath(requested_path)
-    
-    # 3. Ensure the final normalized path is still within the root directory
-    if not safe_path.startswith(indexed_root_abs + os.sep):
-        logger.warning(f"Attempt to access file outside allowed directory: {safe_path} (resolved from {file_path}, root: {indexed_root_abs})")
+    # --- Security Check ---
+    # Join with the configured root, normalize, and ensure the result stays inside it
+    indexed_root = current_app.config['INDEXED_ROOT_DIR']
+    safe_path = safe_join_path(indexed_root, file_path)
+    if safe_path is None:
+        logger.warning(f"Attempt to access file outside allowed directory: {file_path} (root: {indexed_root})")
         abort(403) # Forbidden
 
     # 4. Check if the file actually exists
@@ -416,12 +637,11 @@ def download_backup(filename):
     if '..' in filename or filename.startswith('/'):
         abort(400) # Bad request
 
-    backup_file_path = os.path.join(backup_dir, filename)
-
     # --- Security Check ---
     # Ensure the file is within the designated BACKUP_DIR
-    if not os.path.abspath(backup_file_path).startswith(os.path.abspath(backup_dir)):
-         logger.warning(f"Attempt to access backup file outside allowed directory: {backup_file_path}")
+    backup_file_path = safe_join_path(backup_dir, filename)
+    if backup_file_path is None:
+         logger.warning(f"Attempt to access backup file outside allowed directory: {filename}")
          abort(403) # Forbidden
 
     if not os.path.isfile(backup_file_path):
@@ -430,7 +650,7 @@ def download_backup(filename):
     try:
         return send_file(backup_file_path, as_attachment=True)
     except Exception as e:
-        print(f"Error sending backup file '{backup_file_path}': {e}")
+        logger.error(f"Error sending backup file '{backup_file_path}': {e}")
         abort(500)
 
 @app.route('/download_code_backup/<filename>')
@@ -441,12 +661,11 @@ def download_code_backup(filename):
     if '..' in filename or filename.startswith('/') or not filename.endswith('.zip'):
         abort(400) # Bad request
 
-    backup_file_path = os.path.join(backup_dir, filename)
-
     # --- Security Check ---
     # Ensure the file is within the designated BACKUP_DIR
-    if not os.path.abspath(backup_file_path).startswith(os.path.abspath(backup_dir)):
-         logger.warning(f"Attempt to access code backup file outside allowed directory: {backup_file_path}")
+    backup_file_path = safe_join_path(backup_dir, filename)
+    if backup_file_path is None:
+         logger.warning(f"Attempt to access code backup file outside allowed directory: {filename}")
          abort(403) # Forbidden
 
     if not os.path.isfile(backup_file_path):
@@ -471,12 +690,11 @@ def restore_backup(filename):
         flash("Invalid backup filename provided.", 'error')
         abort(400) # Bad request
 
-    backup_file_path = os.path.join(backup_dir, filename)
-
     # --- Security & Existence Checks ---
     # Ensure the backup file is within the designated BACKUP_DIR
-    if not os.path.abspath(backup_file_path).startswith(os.path.abspath(backup_dir)):
-         logger.error(f"Attempt to restore file outside allowed directory: {backup_file_path}")
+    backup_file_path = safe_join_path(backup_dir, filename)
+    if backup_file_path is None:
+         logger.error(f"Attempt to restore file outside allowed directory: {filename}")
          flash("Invalid backup file location.", 'error')
          abort(403) # Forbidden
 
@@ -487,11 +705,24 @@ def restore_backup(filename):
         
     # --- Perform Restore --- 
     try:
-        # Important: Ensure any active DB connection is closed before overwriting?
-        # Flask usually handles connections per request, so it *should* be okay,
-        # but in a more complex app, explicit connection closing might be needed here.
         logger.warning(f"Attempting to restore database from: {backup_file_path} to {live_db_path}")
-        shutil.copy2(backup_file_path, live_db_path) # copy2 preserves metadata
+        # Pooled connections in every server worker keep the live file, its -wal and -shm open.
+        # Writing the backup in through SQLite (online backup API on a writable connection) goes
+        # through the normal locks and WAL index, so those connections simply see a new snapshot;
+        # replacing or truncating the files underneath them would corrupt what they read.
+        source = sqlite3.connect(backup_file_path)
+        try:
+            target = sqlite3.connect(live_db_path)
+            try:
+                source.backup(target)
+                # Older backups may lack the FTS table / search indexes the pooled connections expect
+                ensure_fts_schema(target)
+                ensure_search_indexes(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+        _meta_cache.clear() # Other workers notice the change through the database/WAL stamp
         logger.info(f"Database successfully restored from {filename}.")
         flash(f"Database successfully restored from '{filename}'.", 'success')
     except Exception as e:
@@ -501,6 +732,47 @@ def restore_backup(filename):
 
     return redirect(url_for('history'))
 
+# --- Git Output Cache ---
+# `git log` / `git tag` output only changes when refs move, so it is cached per
+# command and invalidated by a cheap stamp of the ref files (no subprocess needed
+# to detect a change). Outside a plain .git directory nothing is cached.
+GIT_DIR = '.git'
+_git_cache = {}
+
+def _git_state_stamp(git_dir=GIT_DIR):
+    """Change marker for HEAD, the checked-out branch and the tags, or None if unavailable."""
+    head_path = os.path.join(git_dir, 'HEAD')
+    try:
+        with open(head_path, 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    paths = [head_path, os.path.join(git_dir, 'packed-refs'), os.path.join(git_dir, 'refs', 'tags')]
+    if head.startswith('ref: '):
+        paths.append(os.path.join(git_dir, head[5:])) # e.g. refs/heads/main, rewritten on commit
+    stamp = [head]
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def run_git_cached(cmd):
+    """Runs a git command and returns its stdout, reusing the last output while the refs are unchanged.
+       Raises like subprocess.run(check=True); failures are not cached."""
+    stamp = _git_state_stamp(GIT_DIR)
+    key = tuple(cmd)
+    cached = _git_cache.get(key)
+    if stamp is not None and cached and cached[0] == stamp:
+        logger.debug("Using cached output for git command: %s", cmd)
+        return cached[1]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, encoding='utf-8')
+    if stamp is not None:
+        _git_cache[key] = (stamp, result.stdout)
+    return result.stdout
+
 def get_tag_details():
     """Fetches details for version tags (vX.Y.Z)."""
     logger.info("Fetching version tag details.")
@@ -508,12 +780,11 @@ def get_tag_details():
     # Use %(refname:short) for tag name
     format_string = "%(refname:short)¦%(objectname:short)¦%(creatordate:iso8601)¦%(contents:subject)"
     cmd = ['git', 'tag', '-l', 'v*', f'--format={format_string}', '--sort=-creatordate']
-    logger.debug(f"Running git command: {' '.join(cmd)}")
+    logger.debug("Running git command: %s", cmd)
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, encoding='utf-8')
-        output = result.stdout.strip()
-        logger.debug(f"Raw git tag output: {output}")
+        output = run_git_cached(cmd).strip()
+        logger.debug("Raw git tag output: %s", output)
     except FileNotFoundError:
         logger.error("Git command not found. Is Git installed and in PATH?")
         return []
@@ -533,7 +804,7 @@ def get_tag_details():
     # --- Ensure splitting by lines --- 
     lines = output.strip().splitlines() # Use splitlines() for robust splitting
     # --------------------------------
-    logger.debug(f"Processing {len(lines)} lines from git tag output.") # Add log
+    logger.debug("Processing %s lines from git tag output.", len(lines)) # Add log
 
     for i, line in enumerate(lines):
         parts = line.strip().split('¦', 3)
@@ -543,10 +814,10 @@ def get_tag_details():
             # --- Add Version Parsing and Changelog Fetch --- 
             version_tag_parsed = None
             release_notes_html = None
-            version_match = re.match(r'^v?(\d+\.\d+\.\d+)$', tag_name)
+            version_match = VERSION_TAG_RE.match(tag_name)
             if version_match:
                 version_tag_parsed = version_match.group(1) # Extract X.Y.Z
-                logger.debug(f"[get_tag_details] Found version {version_tag_parsed} in tag '{tag_name}'. Fetching notes.")
+                logger.debug("[get_tag_details] Found version %s in tag '%s'. Fetching notes.", version_tag_parsed, tag_name)
                 release_notes_html = get_changelog_notes(version_tag_parsed)
             # ---------------------------------------------
 
@@ -563,93 +834,202 @@ def get_tag_details():
     logger.info(f"Finished processing tag details. Found {len(tags)} tags.")
     return tags
 
+# --- Streaming Zip Downloads ---
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024 # Bytes read from each source file per step
+
+class _ZipStreamBuffer:
+    """Write-only sink for zipfile; collects output until the generator drains it.
+       It has no tell()/seek(), so zipfile writes a streamable archive (data descriptors)."""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+# Formats that are already compressed: deflating them again costs CPU for ~0% gain
+PRECOMPRESSED_EXTENSIONS = frozenset({'.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar',
+                                      '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4'})
+
+# zlib level for deflated members: level 1 is several times faster than the default 6 and only
+# slightly larger, so streamed downloads (incl. the SQLite database) are rarely CPU-bound
+ZIP_DEFLATE_LEVEL = 1
+
+def zip_compress_type(file_path):
+    """ZIP_STORED for already-compressed files, ZIP_DEFLATED for everything else."""
+    if os.path.splitext(file_path)[1].lower() in PRECOMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def stream_zip(entries):
+    """Yields a zip archive chunk by chunk instead of building it in memory.
+       entries: iterable of (file_path, arcname) tuples; files must exist."""
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file_path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+            zinfo.compress_type = zip_compress_type(file_path)
+            # ZipFile.open(zinfo) ignores the archive's compresslevel; it is read from the ZipInfo,
+            # as public compress_level since Python 3.13 and private _compresslevel before that
+            if hasattr(zinfo, 'compress_level'):
+                zinfo.compress_level = ZIP_DEFLATE_LEVEL
+            else:
+                zinfo._compresslevel = ZIP_DEFLATE_LEVEL
+            with open(file_path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    chunk = src.read(ZIP_STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain() # Entry trailer (data descriptor)
+    yield buffer.drain() # Central directory
+
+def zip_download_response(entries, download_name, temp_files=()):
+    """Returns a streamed attachment response for stream_zip(entries).
+       temp_files are deleted once the response is closed (sent or aborted)."""
+    response = Response(
+        stream_zip(entries),
+        mimetype='application/zip',
+        headers={"Content-Disposition": f"attachment; filename={download_name}"}
+    )
+    for path in temp_files:
+        response.call_on_close(lambda path=path: os.remove(path))
+    return response
+
+def snapshot_database():
+    """Copies the live database to a temp file with the SQLite online backup API and returns its path.
+       The main .db file alone can miss commits still in the WAL, and reading it while a checkpoint
+       runs can give a torn copy."""
+    fd, snapshot_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        dest = sqlite3.connect(snapshot_path)
+        try:
+            get_db().backup(dest)
+        finally:
+            dest.close()
+    except BaseException:
+        os.remove(snapshot_path)
+        raise
+    return snapshot_path
+
 @app.route('/download_commit_package/<commit_hash>')
 def download_commit_package(commit_hash):
     """Creates and sends a zip package containing code and DB backup for a specific commit."""
     backup_dir = 'backups'
-    db_backup_glob = os.path.join(backup_dir, f'commit_{commit_hash}*.db')
-    code_backup_glob = os.path.join(backup_dir, f'commit_{commit_hash}*.zip')
+    prefix = f'commit_{commit_hash}'
     logger.debug(f"Attempting to find backups for commit {commit_hash} in {backup_dir}")
-    logger.debug(f"Using DB glob pattern: {db_backup_glob}")
-    logger.debug(f"Using Code glob pattern: {code_backup_glob}")
 
-    db_backup_files = glob.glob(db_backup_glob)
-    code_backup_files = glob.glob(code_backup_glob)
-    logger.debug(f"Glob result for DB pattern {db_backup_glob}: {db_backup_files}")
-    logger.debug(f"Glob result for Code pattern {code_backup_glob}: {code_backup_files}")
+    # One directory read with plain prefix/suffix checks (no glob pattern matching)
+    db_backup_files, code_backup_files = [], []
+    try:
+        with os.scandir(backup_dir) as it:
+            for entry in it:
+                if entry.name.startswith(prefix) and entry.is_file():
+                    if entry.name.endswith('.db'):
+                        db_backup_files.append(entry.path)
+                    elif entry.name.endswith('.zip'):
+                        code_backup_files.append(entry.path)
+    except FileNotFoundError:
+        logger.warning(f"Backup directory not found: {backup_dir}")
+    logger.debug("Backups matching '%s*' in %s: DB=%s, Code=%s", prefix, backup_dir, db_backup_files, code_backup_files)
 
     if not db_backup_files or not code_backup_files:
-        logger.warning(f"Commit DB backup not found matching pattern {db_backup_glob}")
-        logger.warning(f"Commit Code backup not found matching pattern {code_backup_glob}")
+        logger.warning(f"Commit DB backup not found matching {prefix}*.db in {backup_dir}")
+        logger.warning(f"Commit Code backup not found matching {prefix}*.zip in {backup_dir}")
         abort(404, description="Required backup files not found for this commit.")
 
-    # Use the first match found by glob
-    db_backup_file = db_backup_files[0]
-    code_backup_file = code_backup_files[0]
+    # Use the first match (sorted for a stable choice)
+    db_backup_file = min(db_backup_files)
+    code_backup_file = min(code_backup_files)
     logger.info(f"Found backup files for commit {commit_hash}: DB={os.path.basename(db_backup_file)}, Code={os.path.basename(code_backup_file)}")
 
-    # --- Create a temporary zip file ---
+    # --- Stream the package zip (never held in memory as a whole) ---
     output_filename = f"DenkraumNavigator_package_{commit_hash}.zip"
-    memory_file = io.BytesIO()
+    entries = [
+        (db_backup_file, os.path.basename(db_backup_file)), # The DB backup
+        (code_backup_file, os.path.basename(code_backup_file)), # The code backup zip, stored as-is
+    ]
+    # Optionally add other project files like notes, version, etc.
+    for extra_file in ('PROJECT_NOTES.md', 'CHANGELOG.md', 'VERSION'):
+        if os.path.exists(extra_file):
+            entries.append((extra_file, extra_file))
+
+    logger.info(f"Streaming package zip for commit {commit_hash} ({len(entries)} files)")
+    return zip_download_response(entries, output_filename)
+
+CHANGELOG_FILE = 'CHANGELOG.md'
+
+def parse_changelog(text):
+    """Splits CHANGELOG.md text into {version: markdown_body} in a single pass over the lines.
+       A section runs from its "## [version]" heading to the next "## " heading."""
+    sections = {}
+    current_version, body = None, []
+    for line in text.splitlines():
+        if line.lstrip().startswith('## '):
+            if current_version is not None:
+                sections.setdefault(current_version, '\n'.join(body).strip()) # First section wins
+            heading = CHANGELOG_HEADING_RE.match(line)
+            current_version = heading.group(1).strip() if heading else None
+            body = []
+        elif current_version is not None:
+            body.append(line)
+    if current_version is not None:
+        sections.setdefault(current_version, '\n'.join(body).strip())
+    return sections
+
+def get_changelog_sections(filepath=CHANGELOG_FILE):
+    """Parses CHANGELOG.md into {version: markdown_body}, re-reading only when the file changes."""
+    def parse():
+        with open(filepath, 'r', encoding='utf-8') as f:
+            sections = parse_changelog(f.read())
+        logger.debug("[get_changelog_sections] Parsed %d version sections from %s.", len(sections), filepath)
+        return sections
+    return cached_by_file(filepath, 'changelog_sections', parse) # Raises FileNotFoundError if missing
+
+@lru_cache(maxsize=256)
+def _render_changelog_notes(filepath, mtime, version):
+    """Renders the notes for one version to HTML. Cached per (file, mtime, version),
+       so a changed CHANGELOG.md produces new keys and stale entries simply age out."""
+    sections = get_changelog_sections(filepath)
+    if version not in sections:
+        logger.warning(f"[get_changelog_notes] No CHANGELOG section found for version: {version}")
+        return None
+    notes_markdown = sections[version]
+    if not notes_markdown:
+        logger.warning(f"[get_changelog_notes] Found section for {version} but no notes content after stripping.")
+        return None
+    html_notes = markdown.markdown(notes_markdown)
+    logger.debug("[get_changelog_notes] Successfully rendered notes for %s.", version)
+    return f'<div class=\"changelog-notes\">{html_notes}</div>'
 
-    try:
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # Add the DB backup
-            zf.write(db_backup_file, arcname=os.path.basename(db_backup_file)) 
-            
-            # Add the code backup contents (extract and re-add to avoid nested zip)
-            # Alternatively, just include both zips? Let's add the code zip directly for simplicity.
-            zf.write(code_backup_file, arcname=os.path.basename(code_backup_file))
-            
-            # Optionally add other project files like notes, version, etc.
-            if os.path.exists('PROJECT_NOTES.md'):
-                zf.write('PROJECT_NOTES.md', arcname='PROJECT_NOTES.md')
-            if os.path.exists('CHANGELOG.md'):
-                 zf.write('CHANGELOG.md', arcname='CHANGELOG.md')
-            if os.path.exists('VERSION'):
-                 zf.write('VERSION', arcname='VERSION')
-                 
-        memory_file.seek(0)
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=output_filename
-        )
-    except Exception as e:
-        logger.error(f"Error creating package zip for commit {commit_hash}: {e}")
-        abort(500)
+WORKFLOW_NOTES_FILE = 'COMMIT_VERSIONING_CHANGELOG.md'
+
+def render_markdown_file(filepath):
+    """Reads and renders a markdown file to HTML, re-rendering only when the file changes.
+       Raises FileNotFoundError if the file is missing."""
+    def render():
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return markdown.markdown(f.read())
+    return cached_by_file(filepath, 'markdown_html', render)
 
 def get_changelog_notes(version):
-    """Reads CHANGELOG.md, finds notes for a version, and returns as HTML."""
-    logger.debug(f"[get_changelog_notes] Attempting to get notes for version: '{version}'") # Log exact input
-    filepath = 'CHANGELOG.md'
+    """Looks up the CHANGELOG.md notes for a version and returns them as HTML."""
+    logger.debug("[get_changelog_notes] Attempting to get notes for version: '%s'", version) # Log exact input
+    filepath = CHANGELOG_FILE
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            changelog_content = f.read()
-            logger.debug(f"[get_changelog_notes] Read {len(changelog_content)} chars from {filepath}. Starts with: {changelog_content[:100]}...") # Log snippet
-
-        # Regex to find the version section and capture content until the next heading or EOF
-        # Made more robust to whitespace variations
-        # pattern_str = rf"^## \\[v?{re.escape(str(version))}\\].*?\\n(.*?)(?=\\n## |\\Z)" # Old pattern
-        pattern_str = rf"^##.*?\[v?{re.escape(str(version))}\].*?\n\s*(.*?)(?=\n\s*## |\Z)" # New pattern: Added .*?, \s* after \n, and \s* in lookahead
-        logger.debug(f"[get_changelog_notes] Using regex pattern: {pattern_str}")
-        pattern = re.compile(pattern_str, re.DOTALL | re.MULTILINE | re.IGNORECASE)
-        match = pattern.search(changelog_content)
-
-        if match:
-            notes_markdown = match.group(1).strip()
-            logger.debug(f"[get_changelog_notes] Regex matched! Extracted markdown (first 100 chars): {notes_markdown[:100]}...")
-            if notes_markdown:
-                html_notes = markdown.markdown(notes_markdown)
-                logger.debug(f"[get_changelog_notes] Successfully rendered notes for {version}.")
-                return f'<div class=\"changelog-notes\">{html_notes}</div>'
-            else:
-                logger.warning(f"[get_changelog_notes] Found section for {version} but no notes content after stripping.")
-                return None
-        else:
-            logger.warning(f"[get_changelog_notes] Regex did NOT match for version: {version}")
-            return None
+        return _render_changelog_notes(filepath, os.path.getmtime(filepath), str(version))
     except FileNotFoundError:
         logger.error(f"[get_changelog_notes] {filepath} not found.")
         return None
@@ -657,22 +1037,49 @@ def get_changelog_notes(version):
         logger.error(f"[get_changelog_notes] Error processing {filepath} for version {version}: {e}")
         return None
 
+# Decorated commit list from the last get_commit_details call. Besides the git refs it
+# depends on the backup directory listing and CHANGELOG.md, so all three go into the key.
+_commit_details_cache = {'key': None, 'commits': None}
+
+def _mtime_ns(path):
+    """st_mtime_ns of path, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
 def get_commit_details(limit=50):
-    """Fetches detailed commit history including tags and checks for backups."""
+    """Fetches detailed commit history including tags and checks for backups.
+       Reuses the previous result while the git refs, backup directory and changelog are unchanged."""
+    git_stamp = _git_state_stamp(GIT_DIR)
+    backup_dir = current_app.config.get('BACKUP_DIR', 'backups')
+    key = (limit, git_stamp, backup_dir, _mtime_ns(backup_dir), _mtime_ns(CHANGELOG_FILE))
+    if git_stamp is not None and _commit_details_cache['key'] == key:
+        logger.debug("Using cached commit details (limit: %s).", limit)
+    else:
+        commits = _build_commit_details(limit)
+        # Empty results usually mean git failed; retry on the next request instead of caching
+        _commit_details_cache.update(key=key if commits else None, commits=commits)
+    # Shallow copies so callers can adjust entries without touching the cache
+    return [dict(commit) for commit in _commit_details_cache['commits']]
+
+COMMIT_LOG_FIELDS = 6 # Fields per commit in the git log format below
+
+def _build_commit_details(limit):
+    """Runs git log and decorates each commit with its tags, backups and release notes."""
     logger.info(f"Fetching commit details (limit: {limit}).")
     # Use short hash %h for backup matching, full hash %H for uniqueness if needed elsewhere
-    # Use '|' as separator, include decorations (%d) for tags/branches
-    # Format: short_hash¦full_hash¦date¦subject¦author¦decorations
-    format_string = f"--pretty=format:%h¦%H¦%ad¦%s¦%an¦%d"
+    # NUL between fields (%x00) and between commits (-z), so no subject or author text can break the parse
+    # Fields: short_hash, full_hash, date, subject, author, ref names (%D, e.g. "HEAD -> main, tag: v1.2.3")
+    format_string = "--pretty=format:%h%x00%H%x00%ad%x00%s%x00%an%x00%D"
 
     date_format = "--date=format:%Y-%m-%d %H:%M:%S"
-    cmd = ['git', 'log', f'--max-count={limit}', date_format, format_string]
-    logger.debug(f"Running git command: {' '.join(cmd)}")
+    cmd = ['git', 'log', '-z', f'--max-count={limit}', date_format, format_string]
+    logger.debug("Running git command: %s", cmd)
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, encoding='utf-8')
-        output = result.stdout.strip()
-        logger.debug(f"Raw git log output (first 200 chars): {output[:200]}")
+        output = run_git_cached(cmd)
+        logger.debug("Raw git log output (first 200 chars): %r", output[:200])
     except FileNotFoundError:
         logger.error("Git command not found. Is Git installed and in PATH?")
         return []
@@ -690,73 +1097,54 @@ def get_commit_details(limit=50):
         return []
 
     backup_dir = current_app.config.get('BACKUP_DIR', 'backups')
-
-    lines = output.split('\n')
-    logger.debug(f"Processing {len(lines)} lines from git log.")
-
-    for i, line in enumerate(lines):
-        parts = line.strip().split('¦', 5) # Split by '¦' up to 5 times now
-        if len(parts) == 6:
-            short_hash, full_hash, commit_date, subject, author, decorations = parts
-            tags = []
-            version_tag = None
-            # Parse decorations for tags
-            if decorations:
-                # Remove parentheses if present
-                clean_decorations = decorations.strip().strip('()')
-                decoration_parts = [d.strip() for d in clean_decorations.split(',')]
-                for part in decoration_parts:
-                    if part.startswith('tag: '):
-                        tag_name = part.replace('tag: ', '').strip()
-                        tags.append(tag_name)
-                        # Check if it's a version tag (e.g., v1.2.3 or 1.2.3)
-                        if re.match(r'^v?(\d+\.\d+\.\d+)$', tag_name):
-                           if version_tag is None: # Only take the first version tag found
-                               version_match = re.match(r'^v?(\d+\.\d+\.\d+)$', tag_name)
-                               version_tag = version_match.group(1) # Extract X.Y.Z part
-                               logger.debug(f"Found version tag {tag_name} (parsed as {version_tag}) for commit {short_hash}")
-
-            # --- Use short_hash for backup check ---
-            backup_dir = current_app.config.get('BACKUP_DIR', 'backups')
-            # Use short_hash here
-            db_backup_pattern = os.path.join(backup_dir, f"commit_{short_hash}.db")
-            zip_backup_pattern = os.path.join(backup_dir, f"commit_{short_hash}.zip")
-            logger.debug(f"[get_commit_details] Checking backups for {short_hash} ({full_hash}) in '{backup_dir}'") # Log both
-            logger.debug(f"[get_commit_details]  DB pattern: '{db_backup_pattern}'")
-            logger.debug(f"[get_commit_details]  ZIP pattern: '{zip_backup_pattern}'")
-
-            db_glob_result = glob.glob(db_backup_pattern)
-            zip_glob_result = glob.glob(zip_backup_pattern)
-            logger.debug(f"[get_commit_details]  DB glob result: {db_glob_result}")
-            logger.debug(f"[get_commit_details]  ZIP glob result: {zip_glob_result}")
-
-            db_backup_exists = bool(db_glob_result)
-            zip_backup_exists = bool(zip_glob_result)
-            logger.debug(f"[get_commit_details]  => DB exists: {db_backup_exists}, ZIP exists: {zip_backup_exists}")
-
-            # Fetch changelog notes if it's a version commit
-            release_notes_html = None
-            if version_tag:
-                # --- Add Log ---
-                logger.debug(f"[get_commit_details] Commit {short_hash} has version tag '{version_tag}'. Calling get_changelog_notes.")
-                # -------------
-                release_notes_html = get_changelog_notes(version_tag)
-
-            commits.append({
-                'hash': short_hash, # Use short hash for display/links now
-                'full_hash': full_hash, # Keep full hash if needed
-                'date': commit_date,
-                'subject': subject,
-                'author': author,
-                'tags': tags,
-                'version': version_tag,
-                'has_db_backup': db_backup_exists,
-                'has_zip_backup': zip_backup_exists,
-                'release_notes': release_notes_html
-            })
-        else:
-            logger.warning(f"Could not parse git log line {i+1}: '{line}'. Expected 6 parts separated by '¦', got {len(parts)}.")
-
+    # One directory listing for all commits instead of two glob() scans per commit
+    try:
+        with os.scandir(backup_dir) as entries:
+            backup_names = {entry.name for entry in entries}
+    except FileNotFoundError:
+        logger.warning(f"Backup directory not found: {backup_dir}")
+        backup_names = set()
+
+    fields = output.split('\x00')
+    if len(fields) % COMMIT_LOG_FIELDS:
+        logger.warning(f"Unexpected git log output: {len(fields)} fields is not a multiple of {COMMIT_LOG_FIELDS}; ignoring the incomplete record.")
+    logger.debug("Processing %s commits from git log.", len(fields) // COMMIT_LOG_FIELDS)
+
+    # Consecutive groups of COMMIT_LOG_FIELDS fields, one per commit
+    for short_hash, full_hash, commit_date, subject, author, decorations in zip(*[iter(fields)] * COMMIT_LOG_FIELDS):
+        tags = []
+        version_tag = None
+        # Parse ref names for tags
+        for part in decorations.split(', ') if decorations else ():
+            if part.startswith('tag: '):
+                tag_name = part[len('tag: '):].strip()
+                tags.append(tag_name)
+                # Check if it's a version tag (e.g., v1.2.3 or 1.2.3)
+                version_match = VERSION_TAG_RE.match(tag_name)
+                if version_match and version_tag is None: # Only take the first version tag found
+                    version_tag = version_match.group(1) # Extract X.Y.Z part
+
+        # --- Use short_hash for backup check (O(1) lookups in the listing above) ---
+        db_backup_exists = f"commit_{short_hash}.db" in backup_names
+        zip_backup_exists = f"commit_{short_hash}.zip" in backup_names
+
+        # Fetch changelog notes if it's a version commit
+        release_notes_html = None
+        if version_tag:
+            release_notes_html = get_changelog_notes(version_tag)
+
+        commits.append({
+            'hash': short_hash, # Use short hash for display/links now
+            'full_hash': full_hash, # Keep full hash if needed
+            'date': commit_date,
+            'subject': subject,
+            'author': author,
+            'tags': tags,
+            'version': version_tag,
+            'has_db_backup': db_backup_exists,
+            'has_zip_backup': zip_backup_exists,
+            'release_notes': release_notes_html
+        })
 
     logger.info(f"Finished processing commit details. Found {len(commits)} commits.")
     # logger.debug(f"Example commit data (first one): {commits[0] if commits else 'None'}")
@@ -785,12 +1173,14 @@ def history():
     backup_dir = current_app.config.get('BACKUP_DIR', 'backups')
     manual_db_backups = []
     try:
-        if os.path.exists(backup_dir):
-             # Correctly indented list comprehension
-             manual_db_backups = sorted([f for f in os.listdir(backup_dir) if f.startswith('file_index_') and f.endswith('.db')], reverse=True)
-             logger.debug(f"Found manual backups: {manual_db_backups}")
-        else:
-            logger.warning(f"Manual backup directory not found: {backup_dir}")
+        # One scandir pass; is_file() reuses the entry type from the listing (no extra stat)
+        with os.scandir(backup_dir) as it:
+            manual_db_backups = sorted((entry.name for entry in it
+                                        if entry.name.startswith('file_index_') and entry.name.endswith('.db')
+                                        and entry.is_file(follow_symlinks=False)), reverse=True)
+        logger.debug("Found manual backups: %s", manual_db_backups)
+    except FileNotFoundError:
+        logger.warning(f"Manual backup directory not found: {backup_dir}")
     except Exception as e:
         logger.error(f"Error listing manual backups in {backup_dir}: {e}")
         flash('Error retrieving manual backups.', 'error')
@@ -799,9 +1189,7 @@ def history():
     # Fetch and render COMMIT_VERSIONING_CHANGELOG.md content
     workflow_notes_html = ""
     try:
-        with open('COMMIT_VERSIONING_CHANGELOG.md', 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        workflow_notes_html = markdown.markdown(md_content)
+        workflow_notes_html = render_markdown_file(WORKFLOW_NOTES_FILE)
         logger.debug("Successfully read and rendered COMMIT_VERSIONING_CHANGELOG.md")
     except FileNotFoundError:
         logger.warning("COMMIT_VERSIONING_CHANGELOG.md not found.")
@@ -817,6 +1205,19 @@ def history():
                            manual_db_backups=manual_db_backups,
                            workflow_notes_html=workflow_notes_html) # Add workflow notes
 
+BROWSE_INFO_BATCH_SIZE = 500 # Paths per IN (...) query; stays below SQLite's 999 parameter limit on older builds
+
+def get_file_info_by_path(paths):
+    """Returns {path: row} with the indexed metadata for the given absolute paths, one query per batch."""
+    info_by_path = {}
+    for start in range(0, len(paths), BROWSE_INFO_BATCH_SIZE):
+        batch = paths[start:start + BROWSE_INFO_BATCH_SIZE]
+        placeholders = ', '.join('?' * len(batch))
+        rows = query_db(f"""SELECT path, filename, category_type, category_year, keywords
+                            FROM files WHERE path IN ({placeholders})""", batch)
+        info_by_path.update((row['path'], row) for row in rows)
+    return info_by_path
+
 @app.route('/browse/')
 @app.route('/browse/<path:sub_path>')
 def browse(sub_path=''):
@@ -824,10 +1225,10 @@ def browse(sub_path=''):
     # --- Security and Path Handling ---
     base_dir = os.path.abspath(current_app.config['INDEXED_ROOT_DIR'])
     # Prevent access above the base directory
-    requested_path = os.path.abspath(os.path.join(base_dir, sub_path))
+    requested_path = safe_join_path(base_dir, sub_path)
     
-    if not requested_path.startswith(base_dir):
-        print(f"Attempt to browse outside allowed directory: {requested_path}")
+    if requested_path is None:
+        logger.warning(f"Attempt to browse outside allowed directory: {sub_path}")
         abort(403) # Forbidden
         
     if not os.path.isdir(requested_path):
@@ -837,24 +1238,32 @@ def browse(sub_path=''):
     dirs = []
     files = []
     try:
-        for item in os.listdir(requested_path):
-            item_path = os.path.join(requested_path, item)
-            # Generate relative path for links
-            relative_item_path = os.path.relpath(item_path, base_dir)
-            
-            if os.path.isdir(item_path):
-                dirs.append({'name': item, 'path': relative_item_path})
-            elif os.path.isfile(item_path):
-                # Get file metadata from DB if available
-                # Note: item_path is absolute here, matching DB paths
-                file_info = query_db("""SELECT filename, category_type, category_year, keywords 
-                                         FROM files WHERE path = ?""", [item_path], one=True)
-                files.append({
-                    'name': item,
-                    'path': item_path, # Keep absolute path if needed elsewhere (e.g., for displaying?)
-                    'relative_path': relative_item_path, # <<< ADDED: Pass relative path for url_for
-                    'info': file_info # This might be None if not indexed
-                })
+        # Relative path of this directory, computed once; items just append their name
+        relative_dir = os.path.relpath(requested_path, base_dir)
+        if relative_dir == os.curdir:
+            relative_dir = ''
+        # scandir's DirEntry reuses the file type from the directory listing, so no
+        # extra stat() per item (symlinks are still followed, as with os.path.isdir)
+        with os.scandir(requested_path) as it:
+            for entry in it:
+                item = entry.name
+                item_path = entry.path
+                # Generate relative path for links
+                relative_item_path = os.path.join(relative_dir, item)
+
+                if entry.is_dir():
+                    dirs.append({'name': item, 'path': relative_item_path})
+                elif entry.is_file():
+                    files.append({
+                        'name': item,
+                        'path': item_path, # Keep absolute path if needed elsewhere (e.g., for displaying?)
+                        'relative_path': relative_item_path, # <<< ADDED: Pass relative path for url_for
+                    })
+        # Get file metadata from DB if available, for all files at once
+        # Note: item paths are absolute here, matching DB paths
+        info_by_path = get_file_info_by_path([f['path'] for f in files])
+        for f in files:
+            f['info'] = info_by_path.get(f['path']) # This might be None if not indexed
         # Sort directories and files alphabetically
         dirs.sort(key=lambda x: x['name'].lower())
         files.sort(key=lambda x: x['name'].lower())
@@ -862,18 +1271,14 @@ def browse(sub_path=''):
     except PermissionError:
         abort(403)
     except Exception as e:
-        print(f"Error browsing directory '{requested_path}': {e}")
+        logger.error(f"Error browsing directory '{requested_path}': {e}")
         abort(500)
 
     # --- Breadcrumb Navigation ---
-    path_parts = sub_path.split(os.sep)
-    breadcrumbs = []
-    current_crumb_path = ''
-    breadcrumbs.append({'name': 'Archive Root', 'path': ''}) # Link to base browse page
-    for i, part in enumerate(path_parts):
-        if part:
-            current_crumb_path = os.path.join(current_crumb_path, part)
-            breadcrumbs.append({'name': part, 'path': current_crumb_path})
+    # URL paths always use '/', so crumbs are plain prefix joins (no os.path normalization)
+    path_parts = [part for part in sub_path.split('/') if part]
+    breadcrumbs = [{'name': 'Archive Root', 'path': ''}] # Link to base browse page
+    breadcrumbs.extend({'name': part, 'path': '/'.join(path_parts[:i + 1])} for i, part in enumerate(path_parts))
 
     # Don't show the last part as a link in breadcrumbs
     if len(breadcrumbs) > 1:
@@ -893,9 +1298,43 @@ def browse(sub_path=''):
                            files=files,
                            page_nav_items=page_nav_items) # Pass nav items
 
+TEMPLATE_DIR = 'templates'
+# Files under TEMPLATE_DIR, re-walked only when one of the walked directories changes
+_template_files_cache = {'dirs': (), 'stamp': None, 'files': ()}
+
+def list_template_files(template_dir=TEMPLATE_DIR):
+    """(file_path, arcname) for every file under template_dir, as found by os.walk."""
+    cache = _template_files_cache
+    if cache['stamp'] is not None and cache['dirs'] and cache['dirs'][0] == template_dir:
+        if tuple(_mtime_ns(d) for d in cache['dirs']) == cache['stamp']:
+            return cache['files'] # Adding/removing/renaming a file bumps its directory's mtime
+    dirs, files = [], []
+    for root, _, names in os.walk(template_dir):
+        dirs.append(root)
+        for name in names:
+            file_path = os.path.join(root, name)
+            files.append((file_path, os.path.relpath(file_path, start='.'))) # Use relative path in zip
+    stamp = tuple(_mtime_ns(d) for d in dirs) if dirs else None
+    cache.update(dirs=tuple(dirs), stamp=stamp, files=tuple(files))
+    return cache['files']
+
+def project_zip_entries(project_files):
+    """(file_path, arcname) entries for the given project files plus everything under templates/.
+       Missing files are skipped; a file listed twice is only added once."""
+    entries = {}
+    for f in project_files:
+        if os.path.exists(f):
+            entries.setdefault(os.path.normpath(f), f) # Add file with its path
+        else:
+            logger.warning(f"File not found for zipping: {f}") # Log missing files
+    # Add templates directory content (if not empty and exists)
+    for file_path, arcname in list_template_files():
+        entries.setdefault(os.path.normpath(file_path), arcname)
+    return list(entries.items())
+
 @app.route('/download_code')
 def download_code():
-    """Creates a zip archive of the source code and sends it."""
+    """Creates a zip archive of the source code and streams it."""
     # Define which files/dirs to include
     # Exclude backups, venv, db, logs etc. (already in .gitignore, but good practice here too)
     project_files = [
@@ -908,41 +1347,14 @@ def download_code():
         'templates/index.html',
         'templates/history.html'
     ]
-    
-    memory_file = io.BytesIO()
-    try:
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for f in project_files:
-                if os.path.exists(f):
-                    zf.write(f, arcname=f) # Add file with its path
-                else:
-                    print(f"Warning: File not found for zipping: {f}") # Log missing files
-            
-            # Add templates directory content (if not empty and exists)
-            if os.path.isdir('templates'):
-                 for root, _, files in os.walk('templates'):
-                    for file in files:
-                         file_path = os.path.join(root, file)
-                         arcname = os.path.relpath(file_path, start='.') # Use relative path in zip
-                         zf.write(file_path, arcname=arcname)
-                         
-        memory_file.seek(0)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"dol_data_archiver_code_{timestamp}.zip"
-        
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=zip_filename
-        )
-    except Exception as e:
-        print(f"Error creating code zip file: {e}")
-        abort(500)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_filename = f"dol_data_archiver_code_{timestamp}.zip"
+    # Streamed while it is compressed, instead of building the whole archive in memory first
+    return zip_download_response(project_zip_entries(project_files), zip_filename)
 
 @app.route('/download_package')
 def download_package():
-    """Creates a zip archive of the source code and current database."""
+    """Creates a zip archive of the source code and current database and streams it."""
     # Define files to include (same as download_code plus database)
     project_files = [
         'app.py',
@@ -950,41 +1362,20 @@ def download_package():
         'searcher.py',
         'requirements.txt',
         'VERSION',
-        '.gitignore',
-        current_app.config['DATABASE'] # Add the database file name
+        '.gitignore'
     ]
-    
-    memory_file = io.BytesIO()
+    entries = project_zip_entries(project_files)
+    temp_files = []
     try:
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # Add individual files
-            for f in project_files:
-                if os.path.exists(f):
-                    zf.write(f, arcname=f)
-                else:
-                    print(f"Warning: File not found for zipping: {f}")
-            
-            # Add templates directory
-            if os.path.isdir('templates'):
-                 for root, _, files in os.walk('templates'):
-                    for file in files:
-                         file_path = os.path.join(root, file)
-                         arcname = os.path.relpath(file_path, start='.') 
-                         zf.write(file_path, arcname=arcname)
-                         
-        memory_file.seek(0)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"dol_data_archiver_package_{timestamp}.zip"
-        
-        return send_file(
-            memory_file,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=zip_filename
-        )
-    except Exception as e:
-        print(f"Error creating package zip file: {e}")
-        abort(500)
+        snapshot_path = snapshot_database() # Not the raw file: recent commits may only be in the WAL
+    except (FileNotFoundError, sqlite3.Error) as e:
+        logger.warning(f"Database not added to package: {e}")
+    else:
+        entries.append((snapshot_path, current_app.config['DATABASE'])) # Stored under the database file name
+        temp_files.append(snapshot_path)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_filename = f"dol_data_archiver_package_{timestamp}.zip"
+    return zip_download_response(entries, zip_filename, temp_files)
 
 # --- Project Goals Page ---
 
@@ -1074,8 +1465,8 @@ def update_learnings():
 @app.route('/download_change_notes/<commit_hash>')
 def download_change_notes(commit_hash):
     """Returns the commit message for a given hash as a text file download."""
-    # Basic validation for commit hash (simple check for hex characters and length)
-    if not all(c in '0123456789abcdef' for c in commit_hash) or not (7 <= len(commit_hash) <= 40):
+    # Basic validation for commit hash (lowercase hex, 7-40 chars); strip() does the scan in C
+    if not (7 <= len(commit_hash) <= 40) or commit_hash.strip('0123456789abcdef'):
         logger.warning(f"Invalid commit hash requested for download: {commit_hash}")
         abort(400, description="Invalid commit hash format.")
 
@@ -1120,18 +1511,31 @@ def sanitize_for_id(filename):
     # Remove .md extension
     base = os.path.splitext(filename)[0]
     # Replace non-alphanumeric characters (except hyphen) with hyphen
-    sanitized = re.sub(r'[^a-zA-Z0-9-]', '-', base)
+    sanitized = HTML_ID_UNSAFE_RE.sub('-', base)
     # Remove leading/trailing hyphens and ensure it's not empty
     sanitized = sanitized.strip('-')
     return sanitized if sanitized else 'md-file' # Fallback ID
 
+# A plain file name in the project root: no path separators, not hidden (so no '..')
+ROOT_MD_FILENAME_RE = re.compile(r'[^./\\\x00][^/\\\x00]*\.md')
+
+def list_md_files():
+    """Sorted names of the .md files in the project root (one scandir, no per-file stat)."""
+    with os.scandir('.') as it:
+        return sorted(entry.name for entry in it
+                      if entry.name.endswith('.md') and not entry.name.startswith('.') and entry.is_file())
+
+def is_root_md_file(filename):
+    """True if filename names an existing .md file directly in the project root."""
+    return bool(ROOT_MD_FILENAME_RE.fullmatch(filename)) and os.path.isfile(filename)
+
 @app.route('/md_files')
 def display_md_files():
     """Displays all root .md files for editing."""
     md_files_data = []
     page_nav_items = [] # Initialize list for floating nav
     try:
-        md_filenames = sorted(glob.glob('*.md')) 
+        md_filenames = list_md_files()
         
         for filename in md_filenames:
             file_id = sanitize_for_id(filename) # Generate ID for the section
@@ -1177,9 +1581,8 @@ def update_md_file():
         return redirect(url_for('display_md_files'))
 
     try:
-        # Security Check: Ensure the filename is a valid .md file in the root
-        valid_md_files = glob.glob('*.md')
-        if filename_to_update not in valid_md_files:
+        # Security Check: Ensure the filename is an existing .md file in the root
+        if not is_root_md_file(filename_to_update):
             flash(f'Error: Invalid or disallowed filename: {filename_to_update}', 'error')
             logger.warning(f"Attempt to update invalid/disallowed file: {filename_to_update}")
             return redirect(url_for('display_md_files'))
@@ -1199,45 +1602,69 @@ def update_md_file():
 # --- End Multi-MD File Editor Page ---
 
 # --- Thumbnail Generation Route --- 
+# mimetype -> (Pillow format, cache file extension). WebP only for clients that list it
+# in Accept (and only if this Pillow build can encode it); everyone else gets JPEG.
+THUMBNAIL_FORMATS = {'image/jpeg': ('JPEG', 'jpg')}
+if features.check('webp'):
+    THUMBNAIL_FORMATS['image/webp'] = ('WEBP', 'webp')
+
+def thumbnail_mimetype():
+    """Thumbnail format for the current request: WebP if the client explicitly accepts it, else JPEG."""
+    if 'image/webp' in THUMBNAIL_FORMATS and any(mt == 'image/webp' and q > 0 for mt, q in request.accept_mimetypes):
+        return 'image/webp'
+    return 'image/jpeg'
+
+@lru_cache(maxsize=2048)
+def thumbnail_cache_name(relative_path, extension='jpg'):
+    """Cache file name for an image's thumbnail: the relative path with slashes etc. replaced."""
+    return f"{THUMBNAIL_NAME_UNSAFE_RE.sub('_', relative_path)}_thumb.{extension}"
+
 @app.route('/thumbnail/<path:file_path>')
 def serve_thumbnail(file_path):
     """Generates (if needed) and serves a thumbnail for an image."""
     
     # --- Security Check (Similar to download_file) ---
     # Correctly join the file_path with the configured root directory
-    indexed_root = os.path.abspath(current_app.config['INDEXED_ROOT_DIR'])
-    safe_original_path = os.path.abspath(os.path.join(indexed_root, file_path))
+    indexed_root = current_app.config['INDEXED_ROOT_DIR']
+    safe_original_path = safe_join_path(indexed_root, file_path)
     
     # Ensure the resolved path is still within the indexed root directory
-    if not safe_original_path.startswith(indexed_root + os.sep):
-        logger.warning(f"Attempt to access file outside allowed directory for thumbnail: {safe_original_path} (resolved from {file_path})")
+    if safe_original_path is None:
+        logger.warning(f"Attempt to access file outside allowed directory for thumbnail: {file_path} (root: {indexed_root})")
         abort(403)
 
-    if not os.path.isfile(safe_original_path):
+    try:
+        original_stat = os.stat(safe_original_path) # One stat for both the existence and staleness checks
+    except OSError:
+        original_stat = None
+    if original_stat is None or not stat.S_ISREG(original_stat.st_mode):
         logger.warning(f"Original image not found for thumbnail: {safe_original_path}")
         abort(404)
         
     # --- Thumbnail Path --- 
     cache_dir = current_app.config['THUMBNAIL_CACHE_DIR']
-    # Create a safe filename for the cache (replace slashes, etc.)
     # Using the relative path helps avoid collisions from different base dirs if config changes
     relative_path = os.path.relpath(safe_original_path, current_app.config['INDEXED_ROOT_DIR'])
-    cache_filename_base = re.sub(r'[^a-zA-Z0-9_.-]', '_', relative_path)
-    # Add a suffix to distinguish it as a thumbnail
-    cache_filename = f"{cache_filename_base}_thumb.jpg" # Save as JPG for consistency
-    thumbnail_path = os.path.join(cache_dir, cache_filename)
+    mimetype = thumbnail_mimetype()
+    image_format, extension = THUMBNAIL_FORMATS[mimetype] # Each format has its own cache file
+    thumbnail_path = os.path.join(cache_dir, thumbnail_cache_name(relative_path, extension))
 
-    # --- Generate if needed --- 
-    if not os.path.exists(thumbnail_path):
+    # --- Generate if missing, or older than the original image ---
+    try:
+        thumbnail_is_fresh = os.stat(thumbnail_path).st_mtime_ns >= original_stat.st_mtime_ns
+    except OSError:
+        thumbnail_is_fresh = False
+    if not thumbnail_is_fresh:
         os.makedirs(cache_dir, exist_ok=True) # Ensure cache dir exists
         try:
             logger.info(f"Generating thumbnail for {safe_original_path} at {thumbnail_path}")
-            img = Image.open(safe_original_path)
-            # Handle potential transparency (convert to RGB before saving as JPG)
-            if img.mode in ("RGBA", "P"): 
-                img = img.convert("RGB")
-            img.thumbnail(current_app.config['THUMBNAIL_SIZE'])
-            img.save(thumbnail_path, "JPEG") # Save as JPEG
+            size = current_app.config['THUMBNAIL_SIZE']
+            workers = current_app.config['THUMBNAIL_WORKERS']
+            if workers:
+                # Decode/resize in a worker process; the request thread only waits for the result
+                get_thumbnail_pool(workers).submit(generate_thumbnail, safe_original_path, thumbnail_path, size, image_format).result()
+            else:
+                generate_thumbnail(safe_original_path, thumbnail_path, size, image_format)
         except UnidentifiedImageError:
             logger.error(f"Cannot identify image file (possibly unsupported format): {safe_original_path}")
             # Optionally, serve a placeholder 'cannot display' image here
@@ -1249,7 +1676,11 @@ def serve_thumbnail(file_path):
             
     # --- Serve Thumbnail --- 
     try:
-        return send_file(thumbnail_path, mimetype='image/jpeg')
+        # conditional: ETag/Last-Modified, so revalidating browsers get a 304 instead of the image
+        response = send_file(thumbnail_path, mimetype=mimetype, conditional=True,
+                             max_age=current_app.config['THUMBNAIL_MAX_AGE'])
+        response.vary.add('Accept') # Shared caches must keep the WebP and JPEG variants apart
+        return response
     except Exception as e:
         logger.error(f"Error sending thumbnail file '{thumbnail_path}': {e}")
         abort(500)
@@ -1290,6 +1721,15 @@ def config_page():
                            path_source=path_source)
 # --- End Configuration Page ---
 
+def list_test_functions(test_file_path):
+    """Names of the test_* functions defined in a test file (cached until the file changes)."""
+    def parse():
+        with open(test_file_path, 'r', encoding='utf-8') as f: # Ensure encoding
+            tree = ast.parse(f.read())
+        return tuple(node.name for node in ast.walk(tree)
+                     if isinstance(node, ast.FunctionDef) and node.name.startswith('test_'))
+    return cached_by_file(test_file_path, 'test_functions', parse)
+
 @app.route('/tests')
 def show_tests():
     """Displays a list of discovered unit tests with section navigation."""
@@ -1309,12 +1749,7 @@ def show_tests():
             tests_in_file = []
             error_parsing = False
             try:
-                with open(test_file_path, 'r', encoding='utf-8') as f: # Ensure encoding
-                    source_code = f.read()
-                    tree = ast.parse(source_code)
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.FunctionDef) and node.name.startswith('test_'):
-                            tests_in_file.append(node.name)
+                tests_in_file = list(list_test_functions(test_file_path))
             except Exception as e:
                 logger.error(f"Error parsing test file {test_filename}: {e}")
                 tests_in_file = ["Error parsing file"] # Indicate error
@@ -1373,6 +1808,8 @@ if __name__ == '__main__':
     print("Starting Flask web server...")
     # Access config via the app object here, not current_app
     print("Ensure the database '{}' exists (run indexer.py first).".format(app.config['DATABASE']))
+    if os.path.exists(app.config['DATABASE']):
+        migrate_database(app.config['DATABASE']) # One-time schema migrations, before serving requests
     print("Access the application at http://127.0.0.1:5000")
     # Use debug=False to reduce memory usage and prevent OOM kills
     app.run(debug=False, host='0.0.0.0') # Host 0.0.0.0 makes it accessible on network 
\ No newline at end of file
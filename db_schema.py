@@ -0,0 +1,111 @@
+import os
+import sys
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Full-Text Search Schema ---
+# External-content FTS5 table mirroring the searchable text columns of `files`.
+# The triggers keep it in sync with every INSERT / UPDATE (incl. upserts) / DELETE,
+# so the indexer and clean_up_database.py need no extra code to maintain it.
+FTS_TABLE = 'files_fts'
+
+FTS_SCHEMA = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    filename, summary, keywords,
+    content='files', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS files_fts_ai AFTER INSERT ON files BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, filename, summary, keywords)
+    VALUES (new.id, new.filename, new.summary, new.keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_ad AFTER DELETE ON files BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, filename, summary, keywords)
+    VALUES ('delete', old.id, old.filename, old.summary, old.keywords);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_au AFTER UPDATE ON files BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, filename, summary, keywords)
+    VALUES ('delete', old.id, old.filename, old.summary, old.keywords);
+    INSERT INTO {FTS_TABLE}(rowid, filename, summary, keywords)
+    VALUES (new.id, new.filename, new.summary, new.keywords);
+END;
+'''
+
+# --- Filter / Sort Indexes ---
+# (column, last_modified DESC) pairs let `category_year IN (...)` / `category_type IN (...)`
+# filters return rows already in ORDER BY order, and make the SELECT DISTINCT queries
+# for the dropdowns index-only scans. idx_files_modified serves unfiltered ORDER BY.
+# idx_files_filename_nocase serves case-insensitive 'starts-with' filename searches.
+SEARCH_INDEXES = {
+    'idx_files_year_mod': 'CREATE INDEX IF NOT EXISTS idx_files_year_mod ON files (category_year, last_modified DESC)',
+    'idx_files_type_mod': 'CREATE INDEX IF NOT EXISTS idx_files_type_mod ON files (category_type, last_modified DESC)',
+    'idx_files_modified': 'CREATE INDEX IF NOT EXISTS idx_files_modified ON files (last_modified DESC)',
+    'idx_files_filename_nocase': 'CREATE INDEX IF NOT EXISTS idx_files_filename_nocase ON files (filename COLLATE NOCASE)',
+}
+
+def ensure_search_indexes(conn):
+    """Creates any missing filter/sort indexes. Returns False if they could not be created."""
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = [name for name in SEARCH_INDEXES if name not in existing]
+        if not missing:
+            return True
+        logger.info(f"Creating search indexes: {', '.join(missing)}")
+        for name in missing:
+            conn.execute(SEARCH_INDEXES[name])
+        conn.execute("ANALYZE files") # Refresh planner statistics for the new indexes
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        logger.warning(f"Could not create search indexes: {e}")
+        return False
+
+def has_fts_table(conn):
+    """Returns True if the FTS shadow table exists in the connected database."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)).fetchone()
+    return row is not None
+
+def ensure_fts_schema(conn):
+    """Creates the FTS table + sync triggers if missing and backfills it from `files`.
+       Returns True if full-text search is available afterwards, False otherwise."""
+    try:
+        if has_fts_table(conn):
+            return True
+        logger.info(f"Creating full-text index '{FTS_TABLE}' (one-time migration)...")
+        # Single transaction so a failure can't leave a table without its triggers;
+        # 'rebuild' populates the index from the existing rows of the content table
+        # BEGIN IMMEDIATE: a second migrator waits for the write lock instead of failing halfway
+        conn.executescript(f"BEGIN IMMEDIATE; {FTS_SCHEMA} INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild'); COMMIT;")
+        logger.info(f"Full-text index '{FTS_TABLE}' created.")
+        return True
+    except sqlite3.Error as e:
+        if conn.in_transaction:
+            conn.rollback()
+        # e.g. read-only database or SQLite built without FTS5; callers fall back to LIKE
+        logger.warning(f"Full-text index '{FTS_TABLE}' unavailable: {e}")
+        return False
+
+def migrate_database(db_path, timeout=600):
+    """Adds the FTS index and search indexes to an existing database. Run once per deploy
+       (python db_schema.py), not from web requests: on a large archive the FTS backfill can take
+       minutes. Returns True if full-text search is available afterwards."""
+    conn = sqlite3.connect(db_path, timeout=timeout) # Wait for the indexer/another migrator
+    try:
+        fts_ok = ensure_fts_schema(conn)
+        ensure_search_indexes(conn)
+        return fts_ok
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # Same default as app.py: DENKRAUM_DB_PATH or file_index.db in the working directory
+    path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('DENKRAUM_DB_PATH', 'file_index.db')
+    if not os.path.exists(path):
+        print(f"Database file '{path}' not found, nothing to migrate.", file=sys.stderr)
+        sys.exit(0)
+    if not migrate_database(path):
+        print("Warning: FTS5 full-text index unavailable; web search will fall back to LIKE.", file=sys.stderr)
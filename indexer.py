@@ -6,6 +6,7 @@ import datetime
 from tqdm import tqdm
 import traceback
 import logging
+from db_schema import ensure_fts_schema, ensure_search_indexes # Shared schema
 
 # --- File Processing Libs ---
 try:
@@ -124,6 +125,11 @@ def setup_database(db_name=DATABASE_NAME):
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_year ON files (category_year)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON files (processing_status)')
         conn.commit()
+        # Composite indexes for the web search filters + ORDER BY last_modified
+        ensure_search_indexes(conn)
+        # Full-text index over filename/summary/keywords, kept in sync by triggers
+        if not ensure_fts_schema(conn):
+            print("Warning: FTS5 full-text index could not be created; web search will fall back to LIKE.", file=sys.stderr)
         return conn, cursor
     except sqlite3.Error as e:
         print(f"FATAL: Database setup failed: {e}", file=sys.stderr)
@@ -506,6 +512,12 @@ def index_files(directory_path, db_conn, db_cursor):
 
     # Final commit
     db_conn.commit()
+    # Refresh planner statistics so the year/type/date indexes are chosen for the new data
+    try:
+        db_conn.execute("ANALYZE files")
+        db_conn.commit()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not update planner statistics: {e}")
 
     end_time = time.time()
     duration = end_time - start_time
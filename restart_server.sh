@@ -16,6 +16,7 @@ ACCESS_LOG="$PROJECT_ROOT/gunicorn_access.log"
 ERROR_LOG="$PROJECT_ROOT/gunicorn_error.log"
 BIND_ADDR="0.0.0.0:5000"
 WORKERS=2 # Number of worker processes
+THREADS=4 # Threads per worker (gthread); each thread keeps its own pooled read-only DB connection
 
 echo "Executing reliable server restart procedure (using Gunicorn)..."
 
@@ -48,15 +49,20 @@ if [ -f "$GUNICORN" ]; then
     export DENKRAUM_ARCHIVE_DIR="/opt/dol-data-archive2"
     echo "Setting DENKRAUM_ARCHIVE_DIR to $DENKRAUM_ARCHIVE_DIR"
     
+    # Schema migrations (e.g. building the FTS index) run once here, not inside a request
+    echo "Running database migrations..."
+    python "$PROJECT_ROOT/db_schema.py" || echo "WARNING: Database migration failed (continuing)." >&2
+
     # Use nohup for backgrounding + redirect stdout/stderr to log file
     # Gunicorn options:
     # --bind: Address and port to listen on
     # --workers: Number of worker processes
+    # --threads: Threads per worker (switches to the gthread worker class)
     # --timeout: Worker timeout
     # --log-level: Logging level (e.g., info, debug)
     # --access-logfile: Path for access logs
     # --error-logfile: Path for error logs
-    nohup "$GUNICORN" --bind "$BIND_ADDR" --workers "$WORKERS" --timeout 60 --log-level info --access-logfile "$ACCESS_LOG" --error-logfile "$ERROR_LOG" "$APP_MODULE" &
+    nohup "$GUNICORN" --bind "$BIND_ADDR" --workers "$WORKERS" --threads "$THREADS" --timeout 60 --log-level info --access-logfile "$ACCESS_LOG" --error-logfile "$ERROR_LOG" "$APP_MODULE" &
     
     # Deactivate venv if needed, though background process might inherit it
     # deactivate 
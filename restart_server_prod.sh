@@ -17,6 +17,7 @@ ERROR_LOG="$PROJECT_ROOT/gunicorn_error.log"
 PID_FILE="$PROJECT_ROOT/gunicorn.pid"
 PORT="5000" # Define the port
 WORKERS=2 # Adjust as needed (e.g., based on CPU cores)
+THREADS=4 # Threads per worker (gthread); each thread keeps its own pooled read-only DB connection
 
 echo "Executing reliable server restart procedure (using Gunicorn)..."
 
@@ -128,6 +129,7 @@ echo "Starting Gunicorn..."
 # Gunicorn options:
 # --bind: Address and port (Now uses dynamic $BIND_ADDR)
 # --workers: Number of worker processes
+# --threads: Threads per worker (switches to the gthread worker class)
 # --timeout: Worker timeout
 # --log-level: Logging level (info, debug, etc.)
 # --access-logfile: Path for access logs
@@ -139,8 +141,13 @@ echo "Starting Gunicorn..."
 export DENKRAUM_ARCHIVE_DIR="/opt/dol-data-archive2"
 echo "Setting DENKRAUM_ARCHIVE_DIR to $DENKRAUM_ARCHIVE_DIR"
 
+# Schema migrations (e.g. building the FTS index) run once here, not inside a request
+echo "Running database migrations..."
+python "$PROJECT_ROOT/db_schema.py" || echo "WARNING: Database migration failed (continuing)." >&2
+
 "$GUNICORN" --bind "$BIND_ADDR" \
             --workers "$WORKERS" \
+            --threads "$THREADS" \
             --timeout 60 \
             --log-level info \
             --access-logfile "$ACCESS_LOG" \
@@ -243,4 +243,89 @@ def test_download_link_for_latest_commit(client, app, mocker):
         # subprocess.run(["git", "commit", "--amend", "--no-edit"], check=True)
         print(f"Cleaned up test line from {notes_file}")
     except Exception as clean_e:
-        print(f"Warning: Cleanup failed for {notes_file}: {clean_e}") 
\ No newline at end of file
+        print(f"Warning: Cleanup failed for {notes_file}: {clean_e}") 
+
+
+def test_create_backup_includes_uncheckpointed_wal(app, db_path):
+    """Test that manual backups use SQLite's backup API and so include rows still in the -wal file."""
+    from app import create_backup, get_db
+    with app.app_context():
+        get_db() # Switches the test database to WAL mode
+        writer = sqlite3.connect(db_path)
+        try:
+            writer.execute("PRAGMA wal_autocheckpoint=0") # Keep the commit in the -wal file
+            writer.execute("INSERT INTO files (path, filename) VALUES (?, ?)", ('/test/wal_only', 'wal_only.txt'))
+            writer.commit()
+
+            backup_path = create_backup()
+            assert backup_path is not None
+            backup = sqlite3.connect(backup_path)
+            try:
+                count = backup.execute("SELECT COUNT(*) FROM files WHERE filename = 'wal_only.txt'").fetchone()[0]
+            finally:
+                backup.close()
+            assert count == 1
+        finally:
+            writer.execute("DELETE FROM files WHERE filename = 'wal_only.txt'")
+            writer.commit()
+            writer.close()
+
+def test_restore_keeps_other_connections_consistent(app, client, db_path, backup_dir):
+    """Test that a restore is visible, uncorrupted, to a connection held open by another worker."""
+    from app import get_db
+    with app.app_context():
+        get_db() # Switches the test database to WAL mode
+    other_worker = sqlite3.connect(db_path)
+    try:
+        other_worker.execute("SELECT COUNT(*) FROM files").fetchone()
+        response = client.post('/backup', follow_redirects=True)
+        assert b"Backup created successfully" in response.data
+        backup_name = max(name for name in os.listdir(backup_dir) if name.startswith('file_index_'))
+        writer = sqlite3.connect(db_path)
+        writer.execute("INSERT INTO files (path, filename) VALUES (?, ?)", ('/test/after_backup', 'after_backup.txt'))
+        writer.commit()
+        writer.close()
+        inode = os.stat(db_path).st_ino
+
+        client.post(f'/restore_backup/{backup_name}')
+        assert os.stat(db_path).st_ino == inode # Restored in place through SQLite, not by replacing the file
+        assert other_worker.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+        assert other_worker.execute("SELECT COUNT(*) FROM files WHERE filename = 'after_backup.txt'").fetchone()[0] == 0
+    finally:
+        other_worker.close()
+        os.remove(os.path.join(backup_dir, backup_name))
+
+
+def test_pooled_connection_to_replaced_file_is_closed(app, db_path, tmp_path):
+    """Test that a pooled connection is closed once its database file is replaced."""
+    import app as app_module
+    replacement = sqlite3.connect(tmp_path / 'replacement.db')
+    source = sqlite3.connect(db_path)
+    source.backup(replacement)
+    source.close()
+    replacement.close()
+    with app.app_context():
+        old = app_module.get_db()
+    os.replace(tmp_path / 'replacement.db', db_path) # E.g. a deploy dropping in a new database file
+    with app.app_context():
+        assert app_module.get_db() is not old
+    with pytest.raises(sqlite3.ProgrammingError):
+        old.execute("SELECT 1") # Closed, not leaked
+
+
+def test_history_lists_manual_backups(client, backup_dir):
+    """Test that /history lists manual backup files, newest first, and skips directories."""
+    for name in ('file_index_20250101_000000.db', 'file_index_20250102_000000.db', 'commit_abc1234.db'):
+        with open(os.path.join(backup_dir, name), 'w') as f:
+            f.write('backup')
+    os.makedirs(os.path.join(backup_dir, 'file_index_dir.db'), exist_ok=True)
+    try:
+        response = client.get('/history')
+        assert response.status_code == 200
+        html = response.data.decode('utf-8')
+        assert html.index('file_index_20250102_000000.db') < html.index('file_index_20250101_000000.db')
+        assert 'file_index_dir.db' not in html
+    finally:
+        for name in ('file_index_20250101_000000.db', 'file_index_20250102_000000.db', 'commit_abc1234.db'):
+            os.remove(os.path.join(backup_dir, name))
+        os.rmdir(os.path.join(backup_dir, 'file_index_dir.db'))
@@ -75,6 +75,34 @@ def test_browse_subdir_success(client_browse):
     assert b'subdir1' in response.data
     assert b'/' in response.data # Should have separator now
 
+def test_browse_nested_dir_links(client_browse):
+    """Test that directory links carry the path relative to the archive root."""
+    os.makedirs(os.path.join(app.config['INDEXED_ROOT_DIR'], 'subdir1', 'nested'))
+    response = client_browse.get('/browse/')
+    assert b'href="/browse/subdir1"' in response.data
+    response = client_browse.get('/browse/subdir1')
+    assert b'href="/browse/subdir1/nested"' in response.data
+
+def test_browse_breadcrumbs(client_browse):
+    """Test that each breadcrumb links to the cumulative path and the last one is not a link."""
+    os.makedirs(os.path.join(app.config['INDEXED_ROOT_DIR'], 'subdir1', 'nested'))
+    response = client_browse.get('/browse/subdir1/nested')
+    assert b'<li><a href="/browse/">Archive Root</a></li>' in response.data
+    assert b'<li><a href="/browse/subdir1">subdir1</a></li>' in response.data
+    assert b'<li class="active" aria-current="page">nested</li>' in response.data
+
+def test_browse_file_info_single_query(client_browse):
+    """Test that metadata for all files in a directory is fetched with one IN query."""
+    sub_dir = os.path.join(app.config['INDEXED_ROOT_DIR'], 'subdir1')
+    indexed = {'path': os.path.join(sub_dir, 'sub_file1.pdf'), 'filename': 'sub_file1.pdf',
+               'category_type': 'PDF Document', 'category_year': 2023, 'keywords': ''}
+    with patch('app.query_db', return_value=[indexed]) as mock_query_db:
+        response = client_browse.get('/browse/subdir1')
+    assert response.status_code == 200
+    assert mock_query_db.call_count == 1
+    assert sorted(mock_query_db.call_args[0][1]) == sorted(os.path.join(sub_dir, name) for name in ('sub_file1.pdf', 'sub_file2.docx'))
+    assert response.data.count(b'PDF Document') == 1 # Only the indexed file gets badges
+
 def test_browse_empty_dir(client_browse):
     """Test browsing an empty subdirectory."""
     response = client_browse.get('/browse/subdir2_empty/')
@@ -88,6 +88,14 @@ def test_download_file_success(client):
     assert response.headers['Content-Disposition'] == 'attachment; filename=test_file.txt'
     assert b'Indexed file content.' in response.data
 
+def test_download_file_resumable(client):
+    """Test that downloads answer Range and If-None-Match requests (resume / revalidate)."""
+    response = client.get('/download/subdir/test_file.txt', headers={'Range': 'bytes=8-'})
+    assert response.status_code == 206
+    assert response.data == b'file content.'
+    etag = client.get('/download/subdir/test_file.txt').headers['ETag']
+    assert client.get('/download/subdir/test_file.txt', headers={'If-None-Match': etag}).status_code == 304
+
 def test_download_file_not_found(client):
     """Test downloading a non-existent file."""
     response = client.get('/download/subdir/nonexistent.txt')
@@ -100,6 +108,16 @@ def test_download_file_traversal_attempt(client):
     response = client.get('/download/../../../../etc/passwd') 
     assert response.status_code == 403 # Forbidden
 
+def test_download_file_symlink_escape(client):
+    """Test that a symlink inside the indexed root can't expose files outside it."""
+    indexed_root = app.config['INDEXED_ROOT_DIR']
+    outside_file = os.path.join(os.path.dirname(indexed_root), 'secret.txt')
+    with open(outside_file, 'w') as f:
+        f.write("Outside the archive.")
+    os.symlink(outside_file, os.path.join(indexed_root, 'link_to_secret.txt'))
+    response = client.get('/download/link_to_secret.txt')
+    assert response.status_code == 403
+
 # /download_backup/<filename>
 def test_download_backup_success(client):
     """Test successful download of a manual DB backup."""
@@ -133,7 +151,33 @@ def test_download_code_success(client):
     assert response.status_code == 200
     assert response.mimetype == 'application/zip'
     assert 'attachment; filename=dol_data_archiver_code_' in response.headers['Content-Disposition']
-    # We could inspect the zip content but that gets complex quickly
+    import zipfile, io
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    names = archive.namelist()
+    assert 'app.py' in names
+    assert names.count('templates/index.html') == 1 # Listed explicitly and found by the walk
+
+def test_list_template_files_rewalks_on_change(tmp_path, monkeypatch, mocker):
+    """Test that the template listing is cached until a file is added."""
+    import time
+    import app as app_module
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_module, '_template_files_cache', {'dirs': (), 'stamp': None, 'files': ()})
+    os.makedirs(os.path.join('templates', 'partials'))
+    with open(os.path.join('templates', 'base.html'), 'w') as f:
+        f.write('base')
+    walk = mocker.spy(app_module.os, 'walk')
+
+    assert app_module.list_template_files() == (('templates/base.html', 'templates/base.html'),)
+    assert app_module.list_template_files() == (('templates/base.html', 'templates/base.html'),)
+    assert walk.call_count == 1
+
+    with open(os.path.join('templates', 'partials', 'nav.html'), 'w') as f:
+        f.write('nav')
+    future = time.time() + 10
+    os.utime(os.path.join('templates', 'partials'), (future, future))
+    assert ('templates/partials/nav.html', 'templates/partials/nav.html') in app_module.list_template_files()
+    assert walk.call_count == 2
 
 # /download_package
 def test_download_package_success(client):
@@ -142,4 +186,102 @@ def test_download_package_success(client):
     response = client.get('/download_package')
     assert response.status_code == 200
     assert response.mimetype == 'application/zip'
-    assert 'attachment; filename=dol_data_archiver_package_' in response.headers['Content-Disposition'] 
\ No newline at end of file
+    assert 'attachment; filename=dol_data_archiver_package_' in response.headers['Content-Disposition'] 
+
+def test_download_package_includes_wal_commits(client, tmp_path, monkeypatch, mocker):
+    """Test that the packaged database is a snapshot that includes commits not yet checkpointed."""
+    import sqlite3, zipfile, io
+    db_path = str(tmp_path / DB_FILENAME)
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA wal_autocheckpoint=0") # Keep the new pages out of the main file
+    writer.execute("CREATE TABLE files (id INTEGER PRIMARY KEY)")
+    writer.executemany("INSERT INTO files DEFAULT VALUES", [()] * 50)
+    writer.commit()
+    monkeypatch.setitem(app.config, 'DATABASE', db_path)
+    import app as app_module
+    snapshot = mocker.spy(app_module, 'snapshot_database')
+    try:
+        response = client.get('/download_package')
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        response.close()
+    finally:
+        writer.close()
+    arcname = next(name for name in archive.namelist() if name.endswith(DB_FILENAME))
+    (tmp_path / 'extracted.db').write_bytes(archive.read(arcname))
+    conn = sqlite3.connect(tmp_path / 'extracted.db')
+    assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 50
+    conn.close()
+    assert not os.path.exists(snapshot.spy_return) # Temp snapshot removed once the response is closed
+
+
+# /download_commit_package/<commit_hash>
+def test_download_commit_package_success(client, tmp_path, monkeypatch):
+    """Test packaging the DB and code backups that match a commit hash."""
+    import zipfile, io
+    monkeypatch.chdir(tmp_path) # Route reads the project-relative 'backups' dir
+    os.makedirs('backups')
+    for name in ('commit_abc1234.db', 'commit_abc1234.zip', 'commit_fff0000.db'):
+        with open(os.path.join('backups', name), 'w') as f:
+            f.write(name)
+    response = client.get('/download_commit_package/abc1234')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == ['commit_abc1234.db', 'commit_abc1234.zip']
+    # The code backup is already compressed and is stored as-is
+    assert archive.getinfo('commit_abc1234.zip').compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo('commit_abc1234.db').compress_type == zipfile.ZIP_DEFLATED
+
+def test_download_commit_package_missing_backup(client, tmp_path, monkeypatch):
+    """Test that a commit without both backups returns 404."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('backups')
+    with open(os.path.join('backups', 'commit_abc1234.db'), 'w') as f:
+        f.write('db only')
+    assert client.get('/download_commit_package/abc1234').status_code == 404
+    assert client.get('/download_commit_package/0000000').status_code == 404
+
+# /download_change_notes/<commit_hash>
+@pytest.mark.parametrize('commit_hash', ['abc123', 'ABC1234', 'abc123g', 'a' * 41, 'abc 1234'])
+def test_download_change_notes_invalid_hash(client, commit_hash):
+    """Test that malformed commit hashes are rejected before git is called."""
+    with patch('app.subprocess.run') as mock_run:
+        response = client.get(f'/download_change_notes/{commit_hash}')
+    assert response.status_code == 400
+    mock_run.assert_not_called()
+
+def test_download_change_notes_success(client):
+    """Test that a valid short hash is passed to git and served as a text file."""
+    with patch('app.subprocess.run', return_value=MagicMock(stdout='feat: notes')) as mock_run:
+        response = client.get('/download_change_notes/abc1234')
+    assert response.status_code == 200
+    assert response.data == b'feat: notes'
+    assert mock_run.call_args[0][0][-1] == 'abc1234'
+
+def test_stream_zip_yields_valid_archive(tmp_path, monkeypatch):
+    """Test that stream_zip produces a valid archive in several chunks."""
+    import zipfile, io
+    from app import stream_zip
+    import app as app_module
+    monkeypatch.setattr(app_module, 'ZIP_STREAM_CHUNK_SIZE', 1024)
+    big = tmp_path / 'big.bin'
+    big.write_bytes(os.urandom(10 * 1024))
+    small = tmp_path / 'notes.txt'
+    small.write_text('notes')
+    chunks = list(stream_zip([(str(big), 'big.bin'), (str(small), 'docs/notes.txt')]))
+    assert len(chunks) > 2 # Streamed, not built in one piece
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert archive.testzip() is None
+    assert archive.read('big.bin') == big.read_bytes()
+    assert archive.read('docs/notes.txt') == b'notes'
+
+def test_stream_zip_uses_fast_deflate_level(tmp_path, mocker):
+    """Test that deflated members are compressed at ZIP_DEFLATE_LEVEL, not zlib's default."""
+    import zipfile
+    import app as app_module
+    compressobj = mocker.spy(zipfile.zlib, 'compressobj')
+    notes = tmp_path / 'notes.txt'
+    notes.write_text('notes ' * 100)
+    list(app_module.stream_zip([(str(notes), 'notes.txt')]))
+    assert compressobj.call_args[0][0] == app_module.ZIP_DEFLATE_LEVEL
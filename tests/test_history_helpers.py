@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import pytest
+import os
+import time
+
+# Make the app accessible for testing
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import app as app_module
+
+CHANGELOG_SAMPLE = """# Changelog
+## [1.1.0] - 2025-04-10
+
+### Changes
+
+- feat: Second release (def456)
+
+## [v1.0.0] - 2025-04-01
+
+- feat: Initial release (abc123)
+"""
+
+@pytest.fixture
+def changelog_file(tmp_path):
+    """Writes a sample CHANGELOG.md and returns its path."""
+    path = tmp_path / 'CHANGELOG.md'
+    path.write_text(CHANGELOG_SAMPLE, encoding='utf-8')
+    return str(path)
+
+def test_changelog_sections_parsed(changelog_file):
+    """Test that all version sections are parsed in a single pass."""
+    sections = app_module.get_changelog_sections(changelog_file)
+    assert set(sections) == {'1.1.0', '1.0.0'}
+    assert sections['1.1.0'].startswith('### Changes')
+    assert 'Second release' in sections['1.1.0']
+    assert 'Initial release' not in sections['1.1.0']
+    assert sections['1.0.0'] == '- feat: Initial release (abc123)'
+
+def test_parse_changelog_section_boundaries():
+    """Test that unversioned "## " headings end a section and duplicate versions keep the first body."""
+    text = "## [2.0.0]\n- new\n## Unreleased\n- draft\n## [2.0.0]\n- duplicate\n"
+    assert app_module.parse_changelog(text) == {'2.0.0': '- new'}
+
+def test_cached_by_file_recomputes_on_change(tmp_path):
+    """Test that a file-derived value is reused until the file's mtime/size changes, per key."""
+    path = tmp_path / 'source.txt'
+    path.write_text('one', encoding='utf-8')
+    calls = []
+    def compute():
+        calls.append(1)
+        return path.read_text(encoding='utf-8')
+
+    assert app_module.cached_by_file(str(path), 'test_key', compute) == 'one'
+    assert app_module.cached_by_file(str(path), 'test_key', compute) == 'one'
+    assert len(calls) == 1
+    assert app_module.cached_by_file(str(path), 'other_key', compute) == 'one' # Keys cached separately
+    assert len(calls) == 2
+
+    path.write_text('two', encoding='utf-8')
+    future = time.time() + 10
+    os.utime(path, (future, future))
+    assert app_module.cached_by_file(str(path), 'test_key', compute) == 'two'
+    assert len(calls) == 3
+    with pytest.raises(FileNotFoundError):
+        app_module.cached_by_file(str(tmp_path / 'missing.txt'), 'test_key', compute)
+    assert len(calls) == 3
+
+def test_changelog_notes_rendered(changelog_file, monkeypatch):
+    """Test rendering notes for known and unknown versions."""
+    monkeypatch.setattr(app_module, 'CHANGELOG_FILE', changelog_file)
+    html = app_module.get_changelog_notes('1.0.0')
+    assert html.startswith('<div class="changelog-notes">')
+    assert 'Initial release' in html
+    assert app_module.get_changelog_notes('9.9.9') is None
+
+def test_changelog_notes_render_cached(changelog_file, monkeypatch):
+    """Test that rendered notes are cached until CHANGELOG.md changes."""
+    monkeypatch.setattr(app_module, 'CHANGELOG_FILE', changelog_file)
+    calls = []
+    real_markdown = app_module.markdown.markdown
+    monkeypatch.setattr(app_module.markdown, 'markdown', lambda text: calls.append(text) or real_markdown(text))
+    first = app_module.get_changelog_notes('1.1.0')
+    assert app_module.get_changelog_notes('1.1.0') == first
+    assert len(calls) == 1 # Second lookup served from cache
+    future = time.time() + 20
+    os.utime(changelog_file, (future, future))
+    app_module.get_changelog_notes('1.1.0')
+    assert len(calls) == 2 # New mtime, rendered again
+
+@pytest.fixture
+def fake_git_dir(tmp_path, monkeypatch):
+    """Creates a minimal .git layout (HEAD -> refs/heads/main) and points the app at it."""
+    git_dir = tmp_path / '.git'
+    (git_dir / 'refs' / 'heads').mkdir(parents=True)
+    (git_dir / 'refs' / 'tags').mkdir()
+    (git_dir / 'HEAD').write_text('ref: refs/heads/main\n')
+    (git_dir / 'refs' / 'heads' / 'main').write_text('a' * 40 + '\n')
+    monkeypatch.setattr(app_module, 'GIT_DIR', str(git_dir))
+    monkeypatch.setattr(app_module, '_git_cache', {})
+    monkeypatch.setattr(app_module, '_commit_details_cache', {'key': None, 'commits': None})
+    return git_dir
+
+def test_git_output_cached_until_refs_change(fake_git_dir, mocker):
+    """Test that git output is reused until the checked-out branch ref moves."""
+    mock_run = mocker.patch('app.subprocess.run', return_value=mocker.Mock(stdout='output'))
+    assert app_module.run_git_cached(['git', 'log']) == 'output'
+    assert app_module.run_git_cached(['git', 'log']) == 'output'
+    assert mock_run.call_count == 1
+    (fake_git_dir / 'refs' / 'heads' / 'main').write_text('b' * 40 + '\n') # New commit
+    future = time.time() + 10
+    os.utime(fake_git_dir / 'refs' / 'heads' / 'main', (future, future))
+    app_module.run_git_cached(['git', 'log'])
+    assert mock_run.call_count == 2
+
+def test_commit_details_cached_until_backups_change(fake_git_dir, tmp_path, mocker, monkeypatch):
+    """Test that decorated commits are reused until a backup for them appears."""
+    backup_dir = tmp_path / 'backups'
+    backup_dir.mkdir()
+    monkeypatch.setitem(app_module.app.config, 'BACKUP_DIR', str(backup_dir))
+    monkeypatch.setattr(app_module, 'CHANGELOG_FILE', str(tmp_path / 'CHANGELOG.md'))
+    log_line = '\x00'.join(['abc1234', 'a' * 40, '2025-04-01 10:00:00', 'Initial commit', 'Dev', ''])
+    mock_run = mocker.patch('app.subprocess.run', return_value=mocker.Mock(stdout=log_line))
+    build = mocker.spy(app_module, '_build_commit_details')
+
+    with app_module.app.app_context():
+        first = app_module.get_commit_details(limit=10)
+        first[0]['has_db_backup'] = True # Callers' edits must not leak into the cache
+        second = app_module.get_commit_details(limit=10)
+        assert build.call_count == 1
+        assert second[0]['has_db_backup'] is False
+
+        (backup_dir / 'commit_abc1234.db').write_bytes(b'')
+        future = time.time() + 10
+        os.utime(backup_dir, (future, future))
+        third = app_module.get_commit_details(limit=10)
+    assert build.call_count == 2
+    assert third[0]['has_db_backup'] is True
+    assert mock_run.call_count == 1 # git output itself still served from run_git_cached
+
+def test_markdown_file_rendered(tmp_path):
+    """Test rendering a markdown file, and the error for a missing one."""
+    notes = tmp_path / 'WORKFLOW.md'
+    notes.write_text('# Workflow\n\n- step one\n', encoding='utf-8')
+    html = app_module.render_markdown_file(str(notes))
+    assert '<h1>Workflow</h1>' in html
+    assert '<li>step one</li>' in html
+    with pytest.raises(FileNotFoundError):
+        app_module.render_markdown_file(str(tmp_path / 'missing.md'))
+
+def test_commit_details_parse_nul_separated_log(fake_git_dir, tmp_path, mocker, monkeypatch):
+    """Test parsing NUL-separated git log records, including tags and separator-like text in subjects."""
+    monkeypatch.setitem(app_module.app.config, 'BACKUP_DIR', str(tmp_path / 'backups'))
+    monkeypatch.setattr(app_module, 'CHANGELOG_FILE', str(tmp_path / 'CHANGELOG.md'))
+    records = [
+        ['bbb2222', 'b' * 40, '2025-04-02 10:00:00', 'fix: a¦b | c, (d)', 'Dev', 'HEAD -> main, tag: v1.2.3, tag: nightly'],
+        ['aaa1111', 'a' * 40, '2025-04-01 10:00:00', 'Initial commit', 'Dev', ''],
+    ]
+    mock_run = mocker.patch('app.subprocess.run', return_value=mocker.Mock(stdout='\x00'.join('\x00'.join(r) for r in records)))
+
+    with app_module.app.app_context():
+        commits = app_module.get_commit_details(limit=10)
+    assert '-z' in mock_run.call_args[0][0]
+    assert [c['hash'] for c in commits] == ['bbb2222', 'aaa1111']
+    assert commits[0]['subject'] == 'fix: a¦b | c, (d)'
+    assert commits[0]['tags'] == ['v1.2.3', 'nightly']
+    assert commits[0]['version'] == '1.2.3'
+    assert commits[1]['tags'] == [] and commits[1]['version'] is None
@@ -69,7 +69,7 @@ def test_get_learnings_success(mock_file, client_md):
         # assert b"# Test Learnings" in response.data
         mock_file.assert_called_once_with(LEARNINGS_FILE, 'r', encoding='utf-8')
 
-@patch('app.glob.glob') # Patch glob within the app module
+@patch('app.list_md_files') # Patch the root .md listing within the app module
 @patch('app.open', new_callable=mock_open)
 def test_get_md_files_success(mock_open_app, mock_glob_app, client_md):
     """Test successfully loading the /md_files page."""
@@ -97,8 +97,8 @@ def test_get_md_files_success(mock_open_app, mock_glob_app, client_md):
     with patch('jinja2.loaders.FileSystemLoader.get_source', return_value=('Template source with loop', 'template.html', lambda: True)):
         response = client_md.get('/md_files')
         assert response.status_code == 200
-        mock_glob_app.assert_called_once_with('*.md')
-        # Check open was called for each file found by glob
+        mock_glob_app.assert_called_once_with()
+        # Check open was called for each file found by the listing
         # Note: mock_open_app tracks calls made *through the patch*
         assert mock_open_app.call_count >= 2 # At least 2 for the MD files
         mock_open_app.assert_has_calls([
@@ -132,11 +132,10 @@ def test_update_learnings_success(mock_file, client_md):
     mock_file.assert_called_once_with(LEARNINGS_FILE, 'w', encoding='utf-8')
     mock_file().write.assert_called_once_with(new_content)
 
-@patch('app.glob.glob')
+@patch('app.os.path.isfile', return_value=True)
 @patch('app.open', new_callable=mock_open)
-def test_update_md_file_success(mock_file, mock_glob, client_md):
+def test_update_md_file_success(mock_file, mock_isfile, client_md):
     """Test successfully updating a specific MD file via POST."""
-    mock_glob.return_value = [NOTES_FILE]
     new_content = "Updated Notes Content"
     response = client_md.post('/update_md_file', data={
         'filename': NOTES_FILE,
@@ -144,23 +143,21 @@ def test_update_md_file_success(mock_file, mock_glob, client_md):
     })
     assert response.status_code == 302
     assert response.location == '/md_files'
-    mock_glob.assert_called_once_with('*.md')
+    mock_isfile.assert_any_call(NOTES_FILE)
     mock_file.assert_called_once_with(NOTES_FILE, 'w', encoding='utf-8')
     mock_file().write.assert_called_once_with(new_content)
 
-@patch('app.glob.glob')
+@pytest.mark.parametrize('filename', ['../etc/passwd', '../README.md', 'templates/index.md', '.hidden.md', 'MISSING_FILE.md'])
 @patch('app.open', new_callable=mock_open)
-def test_update_md_file_invalid_filename(mock_file, mock_glob, client_md):
+def test_update_md_file_invalid_filename(mock_file, filename, client_md):
     """Test updating an MD file with a disallowed filename."""
-    mock_glob.return_value = [NOTES_FILE]
     new_content = "Trying to write to wrong file"
     response = client_md.post('/update_md_file', data={
-        'filename': '../etc/passwd',
+        'filename': filename,
         'md_content': new_content
     })
     assert response.status_code == 302
     assert response.location == '/md_files'
-    mock_glob.assert_called_once_with('*.md')
     mock_file.assert_not_called()
 
 def test_update_goals_missing_data(client_md):
@@ -6,6 +6,7 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app import app # Import the Flask app instance
+from db_schema import migrate_database
 
 DB_FILENAME = 'test_search.db' # Use a dedicated test DB filename
 
@@ -53,6 +54,7 @@ def client_search(tmp_path): # Use pytest's tmp_path fixture
         """, sample_data)
     conn.commit()
     conn.close()
+    migrate_database(str(db_path)) # FTS + search indexes, as the indexer / db_schema.py add them
     
     # Configure app to use this test database
     app.config['TESTING'] = True
@@ -114,4 +116,240 @@ def test_search_no_results(client_search):
     """Test search returning no results."""
     response = client_search.post('/', data={'filename': 'nonexistent'})
     assert response.status_code == 200
-    assert b'No files found matching your criteria.' in response.data 
\ No newline at end of file
+    assert b'No files found matching your criteria.' in response.data 
+
+
+def test_search_request_does_not_migrate(tmp_path, monkeypatch):
+    """Test that requests never build the FTS index themselves, but pick it up once it exists."""
+    db_path = str(tmp_path / 'pre_fts.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(DB_SCHEMA)
+    conn.execute("INSERT INTO files (path, filename, keywords) VALUES (?, ?, ?)", ('/a/report.txt', 'report.txt', 'annual'))
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, 'DATABASE', db_path)
+    from app import fts_enabled
+    with app.test_client() as client:
+        response = client.post('/', data={'filename': 'report'})
+        assert b'report.txt' in response.data # Served by the LIKE fallback
+        with app.app_context():
+            assert not fts_enabled()
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'files_fts'").fetchone() is None
+        conn.close()
+
+        assert migrate_database(db_path)
+        with app.app_context():
+            assert fts_enabled() # Not stuck on the cached negative result
+        response = client.post('/', data={'keywords': 'annual'})
+        assert b'report.txt' in response.data
+
+def test_search_fts_tracks_new_rows(client_search):
+    """Test that rows added after the migration are searchable via the sync triggers."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("INSERT INTO files (path, filename, category_type, category_year, keywords) VALUES (?, ?, ?, ?, ?)",
+                 ('/path/new/sap_notes.txt', 'sap_notes.txt', 'Text', 2022, 'sap.m.Button,widgets'))
+    conn.commit()
+    conn.close()
+    response = client_search.post('/', data={'keywords': 'sap.m.Button'})
+    assert response.status_code == 200
+    assert b'sap_notes.txt' in response.data
+    assert b'file1.txt' not in response.data
+
+def test_migrate_database_creates_indexes(client_search):
+    """Test that the migration adds the FTS table and the filter/sort indexes to existing databases."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    conn.close()
+    assert {'files_fts', 'idx_files_year_mod', 'idx_files_type_mod', 'idx_files_modified'} <= names
+
+def test_search_fts_drives_filtered_query(client_search, mocker):
+    """Test that a MATCH combined with year/type filters is planned from the FTS index outward."""
+    import app as app_module
+    spy = mocker.spy(app_module, 'query_db')
+    with app.app_context():
+        results = app_module.search_database(years=['2023'], file_types=['Text'], keywords='keyword1')
+    assert [r['filename'] for r in results] == ['file1.txt']
+    sql, params = spy.call_args[0][:2]
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("ANALYZE") # Statistics must not flip the join order
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    conn.close()
+    assert plan[0].startswith('SCAN files_fts VIRTUAL TABLE')
+    assert any('files USING INTEGER PRIMARY KEY' in step for step in plan)
+
+def test_search_results_paginated(client_search, monkeypatch):
+    """Test that results are split into pages linked by repeated-parameter GET URLs."""
+    monkeypatch.setitem(app.config, 'SEARCH_RESULTS_PER_PAGE', 1)
+    response = client_search.post('/', data={'year': ['2023', '2024'], 'type': ['Text', 'Image']})
+    assert b'Showing matching files 1&ndash;1.' in response.data
+    assert b'Previous' not in response.data
+    assert b'page=2' in response.data and b'year=2023&amp;year=2024' in response.data
+
+    response = client_search.get('/?year=2023&year=2024&type=Text&type=Image&page=2')
+    assert b'Showing matching files 2&ndash;2.' in response.data
+    assert b'page=1' in response.data
+    assert b'Next' not in response.data # Only two files match
+
+def test_search_years_deduplicated_and_invalid_skipped(client_search, mocker):
+    """Test that repeated years are bound once and an invalid year doesn't drop the whole filter."""
+    import app as app_module
+    spy = mocker.spy(app_module, 'query_db')
+    with app.app_context():
+        results = app_module.search_database(years=['2024', 'abc', '2024', ' 2024 '])
+    assert [r['filename'] for r in results] == ['document.docx']
+    assert spy.call_args[0][1] == [2024]
+
+def test_search_huge_page_number(client_search):
+    """Test that an out-of-range page number is clamped instead of overflowing SQLite's INTEGER."""
+    response = client_search.get('/?keywords=keyword1&page=99999999999999999999')
+    assert response.status_code == 200
+    assert b'Next' not in response.data
+
+
+def test_search_database_empty_criteria_skips_db(client_search, tmp_path, monkeypatch):
+    """Test that a search without criteria returns early without opening the database."""
+    from app import search_database
+    monkeypatch.setitem(app.config, 'DATABASE', str(tmp_path / 'missing.db')) # get_db() would raise
+    with app.app_context():
+        assert search_database() == []
+        assert search_database(filename='', years=[], file_types=[], keywords='') == []
+
+def test_search_by_filename_prefix(client_search):
+    """Test 'starts-with' filename search using a trailing '*'."""
+    response = client_search.post('/', data={'filename': 'doc*'})
+    assert response.status_code == 200
+    assert b'document.docx' in response.data
+    assert b'file1.txt' not in response.data
+    assert b'image.jpg' not in response.data
+
+def test_search_by_filename_prefix_with_underscore(client_search):
+    """Test that '_' and '%' in a 'starts-with' term are matched literally against the name's start."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.executemany("INSERT INTO files (path, filename) VALUES (?, ?)",
+                     [('/path/annual_report.pdf', 'annual_report.pdf'),
+                      ('/path/2023_annual_report_final.pdf', '2023_annual_report_final.pdf'),
+                      ('/path/annualXreport.pdf', 'annualXreport.pdf')])
+    conn.commit()
+    conn.close()
+    response = client_search.post('/', data={'filename': 'annual_report*'})
+    assert b'<span class="filename">annual_report.pdf</span>' in response.data
+    assert b'2023_annual_report_final.pdf' not in response.data
+    assert b'annualXreport.pdf' not in response.data
+
+def test_search_by_filename_prefix_ignores_case(client_search, mocker):
+    """Test that 'starts-with' search ignores ASCII case and is served by the NOCASE index."""
+    import app as app_module
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.executemany("INSERT INTO files (path, filename, last_modified) VALUES (?, ?, ?)",
+                     [(f'/path/bulk/{i}.txt', f'bulk_{i:04d}.txt', i) for i in range(500)])
+    conn.commit()
+    conn.execute("ANALYZE files") # Realistic statistics: the filename range is selective
+    conn.commit()
+    conn.close()
+    spy = mocker.spy(app_module, 'query_db')
+    with app.app_context():
+        results = app_module.search_database(filename='DOC*')
+    assert [r['filename'] for r in results] == ['document.docx']
+    sql, params = spy.call_args[0][:2]
+    conn = sqlite3.connect(app.config['DATABASE'])
+    plan = ' '.join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    conn.close()
+    assert 'idx_files_filename_nocase' in plan
+
+@pytest.mark.parametrize('prefix, bounds', [
+    ('Report', ('report', 'reporu')),
+    ('aZ', ('az', 'a{')),
+    ('x@', ('x@', 'x[')), # 'A'-'Z' fold to 'a'-'z', so the bound must skip them
+    ('x\U0010ffff', None), # No code point follows; callers fall back to the LIKE/FTS path
+    ('ab\ud7ff', ('ab\ud7ff', 'ab\ue000')), # Skips the surrogate range, which can't be bound
+])
+def test_nocase_prefix_bounds(prefix, bounds):
+    """Test the NOCASE range bounds used for 'starts-with' searches."""
+    from app import nocase_prefix_bounds
+    assert nocase_prefix_bounds(prefix) == bounds
+
+def test_search_filename_prefix_ending_in_last_code_point(client_search):
+    """Test 'starts-with' terms whose upper bound would be U+10FFFF + 1 or a surrogate (U+D7FF + 1)."""
+    response = client_search.post('/', data={'filename': 'doc\U0010ffff*'})
+    assert response.status_code == 200
+    response = client_search.post('/', data={'filename': 'ab\ud7ff*'})
+    assert response.status_code == 200
+
+
+def test_search_filename_matches_word_starts(client_search):
+    """Test that filename terms match the start of a word in the name, and '_' alone matches literally."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("INSERT INTO files (path, filename) VALUES (?, ?)", ('/path/annual_report.pdf', 'annual_report.pdf'))
+    conn.commit()
+    conn.close()
+    response = client_search.post('/', data={'filename': 'rep'})
+    assert b'<span class="filename">annual_report.pdf</span>' in response.data
+    response = client_search.post('/', data={'filename': 'port'})
+    assert b'<span class="filename">annual_report.pdf</span>' not in response.data # Not a substring search
+    response = client_search.post('/', data={'filename': '_'})
+    assert b'<span class="filename">annual_report.pdf</span>' in response.data
+    assert b'file1.txt' not in response.data
+    assert b'Filename word starts with:' in response.data
+
+
+def test_search_like_wildcards_taken_literally(client_search):
+    """Test that % and _ in a search term match themselves, not any character."""
+    response = client_search.post('/', data={'keywords': '%'})
+    assert b'file1.txt' not in response.data
+    response = client_search.post('/', data={'filename': '_'})
+    assert b'file1.txt' not in response.data
+
+def test_get_top_keywords_counts(client_search):
+    """Test SQL keyword aggregation: splitting, trimming, counting and ordering."""
+    from app import get_top_keywords
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute("INSERT INTO files (path, filename, keywords) VALUES (?, ?, ?)",
+                 ('/path/extra.txt', 'extra.txt', ' keyword2 , ,keyword5'))
+    conn.commit()
+    conn.close()
+    with app.app_context():
+        top = get_top_keywords()
+        assert top[0] == ('keyword2', 3)
+        assert ('keyword1', 2) in top
+        assert ('keyword5', 1) in top
+        assert '' not in dict(top)
+        assert len(get_top_keywords(limit=2)) == 2
+
+def test_cached_db_query_invalidated_on_db_change(client_search):
+    """Test that metadata caching is reused until the database file changes."""
+    from app import cached_db_query
+    calls = []
+    def compute():
+        calls.append(1)
+        return len(calls)
+    with app.app_context():
+        assert cached_db_query('test_key', compute) == 1
+        assert cached_db_query('test_key', compute) == 1 # Served from cache
+        conn = sqlite3.connect(app.config['DATABASE'])
+        conn.execute("INSERT INTO files (path, filename) VALUES (?, ?)", ('/path/new.txt', 'new.txt'))
+        conn.commit()
+        conn.close()
+        assert cached_db_query('test_key', compute) == 2 # DB changed, recomputed
+
+def test_db_connection_pooled_across_requests(client_search):
+    """Test that requests reuse one pooled, read-only WAL connection per thread."""
+    import threading
+    from app import get_db
+    with app.app_context():
+        first = get_db()
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert first.execute("PRAGMA mmap_size").fetchone()[0] == 1073741824
+        with pytest.raises(sqlite3.OperationalError):
+            first.execute("DELETE FROM files") # query_only
+    with app.app_context():
+        assert get_db() is first
+    other_thread = []
+    def open_in_thread():
+        with app.app_context():
+            other_thread.append(get_db().execute("SELECT COUNT(*) FROM files").fetchone()[0])
+            other_thread.append(get_db() is first)
+    worker = threading.Thread(target=open_in_thread)
+    worker.start()
+    worker.join()
+    assert other_thread == [3, False] # Each thread has its own connection
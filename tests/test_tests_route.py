@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+
+# Make the app accessible for testing
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import app as app_module
+from app import app as flask_app
+
+def test_tests_page_lists_test_functions():
+    """Test that the /tests page lists the test files and their test functions."""
+    with flask_app.test_client() as client:
+        response = client.get('/tests')
+    assert response.status_code == 200
+    assert b'test_tests_route.py' in response.data
+    assert b'test_tests_page_lists_test_functions' in response.data
+
+def test_list_test_functions(tmp_path):
+    """Test that only test_* functions are listed from a test file."""
+    test_file = tmp_path / 'test_sample.py'
+    test_file.write_text('def test_one():\n    pass\n\ndef helper():\n    pass\n\ndef test_two():\n    pass\n', encoding='utf-8')
+    assert app_module.list_test_functions(str(test_file)) == ('test_one', 'test_two')
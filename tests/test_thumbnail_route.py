@@ -89,6 +89,16 @@ def client():
     shutil.rmtree(cache_dir, ignore_errors=True)
     shutil.rmtree(upload_dir, ignore_errors=True)
 
+@pytest.fixture
+def thumbnail_dirs(tmp_path, monkeypatch):
+    """Points the app at an empty archive dir and thumbnail cache under tmp_path; returns both."""
+    archive_dir = tmp_path / 'archive'
+    archive_dir.mkdir()
+    cache_dir = tmp_path / 'thumbs'
+    monkeypatch.setitem(flask_app.config, 'INDEXED_ROOT_DIR', str(archive_dir))
+    monkeypatch.setitem(flask_app.config, 'THUMBNAIL_CACHE_DIR', str(cache_dir))
+    return archive_dir, cache_dir
+
 # --- Test Cases ---
 
 @pytest.mark.skip(reason="Temporarily skipping due to persistent mocking/path issues (absolute vs relative) interfering with save/send_file/exists checks.")
@@ -208,4 +218,78 @@ def test_thumbnail_path_traversal_attempt(client):
     response = client.get(url_for('serve_thumbnail', file_path='../outside_upload.jpg'))
     assert response.status_code == 403 
 
-# Add more tests? (e.g., different image types if supported, different sizes) 
\ No newline at end of file
+# Add more tests? (e.g., different image types if supported, different sizes) 
+
+
+def test_thumbnail_cached_and_revalidated(client, thumbnail_dirs):
+    """Test that thumbnails are generated once, served with an ETag and rebuilt when the image changes."""
+    archive_dir, cache_dir = thumbnail_dirs
+    image_path = archive_dir / 'photo.png'
+    Image.new('RGBA', (400, 300), (255, 0, 0, 128)).save(image_path)
+
+    real_open = Image.open
+    with patch('thumbnails.Image.open', wraps=real_open) as mock_open_image:
+        response = client.get('/thumbnail/photo.png')
+        assert response.status_code == 200
+        assert real_open(io.BytesIO(response.data)).size == (100, 75)
+        etag = response.headers['ETag']
+        response.close()
+
+        response = client.get('/thumbnail/photo.png', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert mock_open_image.call_count == 1 # Served from the thumbnail cache
+
+        future = os.path.getmtime(image_path) + 10
+        os.utime(image_path, (future, future)) # Original changed after the thumbnail was made
+        response = client.get('/thumbnail/photo.png')
+        assert response.status_code == 200
+        assert mock_open_image.call_count == 2
+        response.close()
+    assert os.listdir(cache_dir) == ['photo.png_thumb.jpg'] # No temp files left behind
+
+def test_thumbnail_generated_in_worker_pool(client, thumbnail_dirs, monkeypatch):
+    """Test thumbnail rendering through the optional process pool."""
+    import thumbnails
+    archive_dir, _ = thumbnail_dirs
+    Image.new('RGB', (640, 480), (0, 128, 255)).save(archive_dir / 'photo.jpg')
+    monkeypatch.setitem(flask_app.config, 'THUMBNAIL_WORKERS', 1)
+    monkeypatch.setattr(thumbnails, '_pool', None)
+
+    try:
+        response = client.get('/thumbnail/photo.jpg')
+        assert response.status_code == 200
+        assert Image.open(io.BytesIO(response.data)).size == (100, 75)
+        response.close()
+        assert thumbnails._pool is not None
+    finally:
+        if thumbnails._pool is not None:
+            thumbnails._pool.shutdown()
+
+def test_thumbnail_x_sendfile(client, thumbnail_dirs, monkeypatch):
+    """Test that with USE_X_SENDFILE the thumbnail is handed to the front-end server by path."""
+    archive_dir, cache_dir = thumbnail_dirs
+    Image.new('RGB', (200, 200), (0, 255, 0)).save(archive_dir / 'green.jpg')
+    monkeypatch.setitem(flask_app.config, 'USE_X_SENDFILE', True)
+
+    response = client.get('/thumbnail/green.jpg')
+    assert response.status_code == 200
+    assert response.headers['X-Sendfile'] == os.path.abspath(cache_dir / 'green.jpg_thumb.jpg')
+    assert response.data == b'' # Body is left to the front-end server
+
+def test_thumbnail_webp_negotiated(client, thumbnail_dirs):
+    """Test that clients accepting WebP get a WebP thumbnail, cached separately from the JPEG one."""
+    archive_dir, cache_dir = thumbnail_dirs
+    Image.new('RGBA', (300, 300), (0, 0, 255, 64)).save(archive_dir / 'logo.png')
+
+    response = client.get('/thumbnail/logo.png', headers={'Accept': 'image/avif,image/webp,image/*,*/*;q=0.8'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'Accept' in response.headers['Vary']
+    thumb = Image.open(io.BytesIO(response.data))
+    assert thumb.format == 'WEBP' and thumb.mode == 'RGBA' # Transparency kept
+    response.close()
+
+    response = client.get('/thumbnail/logo.png', headers={'Accept': 'image/png,image/*;q=0.8'})
+    assert response.mimetype == 'image/jpeg' # image/* alone doesn't prove WebP support
+    response.close()
+    assert sorted(os.listdir(cache_dir)) == ['logo.png_thumb.jpg', 'logo.png_thumb.webp']
@@ -21,6 +21,7 @@ VERSION_FILE = version_bumper.VERSION_FILE
 CHANGELOG_FILE = version_bumper.CHANGELOG_FILE
 DB_FILENAME = version_bumper.DB_FILENAME
 DB_ZIP_FILENAME = version_bumper.DB_ZIP_FILENAME
+DB_SNAPSHOT_FILENAME = version_bumper.DB_SNAPSHOT_FILENAME
 
 @pytest.fixture
 def mock_dependencies(mocker):
@@ -32,6 +33,7 @@ def mock_dependencies(mocker):
         'get_commits_since_tag': mocker.patch('version_bumper.get_commits_since_tag', return_value="- Feat: New feature (abc123)"),
         'update_version_file': mocker.patch('version_bumper.update_version_file'),
         'update_changelog': mocker.patch('version_bumper.update_changelog'),
+        'snapshot_database': mocker.patch('version_bumper.snapshot_database'),
         'os_path_exists': mocker.patch('os.path.exists'),
         'zipfile_ZipFile': mocker.patch('zipfile.ZipFile'),
         'print': mocker.patch('builtins.print') # Mock print to check warnings
@@ -60,9 +62,10 @@ def test_zip_created_and_staged_when_db_exists(mock_dependencies):
     run_main_with_args(['--minor'])
     
     # Assert ZipFile was called correctly
+    mock_dependencies['snapshot_database'].assert_called_once_with(DB_FILENAME, DB_SNAPSHOT_FILENAME)
     mock_dependencies['zipfile_ZipFile'].assert_called_once_with(DB_ZIP_FILENAME, 'w', zipfile.ZIP_DEFLATED)
     # Assert the mock ZipFile's write method was called
-    mock_zip_instance.write.assert_called_once_with(DB_FILENAME, arcname=DB_FILENAME)
+    mock_zip_instance.write.assert_called_once_with(DB_SNAPSHOT_FILENAME, arcname=DB_FILENAME)
     
     # Assert run_command was called for git add with the zip file
     expected_add_call = call(["git", "add", VERSION_FILE, CHANGELOG_FILE, DB_ZIP_FILENAME])
@@ -102,7 +105,7 @@ def test_zip_failure_warning_and_commit_proceeds(mock_dependencies):
 
     # Assert ZipFile was called
     mock_dependencies['zipfile_ZipFile'].assert_called_once_with(DB_ZIP_FILENAME, 'w', zipfile.ZIP_DEFLATED)
-    mock_zip_instance.write.assert_called_once_with(DB_FILENAME, arcname=DB_FILENAME) # Write is still attempted
+    mock_zip_instance.write.assert_called_once_with(DB_SNAPSHOT_FILENAME, arcname=DB_FILENAME) # Write is still attempted
 
     # Fix 1: Assert run_command was called for git add *without* the zip file name
     # because the exception prevented it from being added to files_to_add
@@ -115,4 +118,22 @@ def test_zip_failure_warning_and_commit_proceeds(mock_dependencies):
 
     # Assert that the commit command was still called
     expected_commit_call = call(["git", "commit", "-m", "chore: Bump version to 2.0.0"]) # Calculated based on fixture
-    assert expected_commit_call in mock_dependencies['run_command'].call_args_list 
\ No newline at end of file
+    assert expected_commit_call in mock_dependencies['run_command'].call_args_list 
+
+def test_snapshot_database_includes_wal_commits(tmp_path):
+    """Test that the snapshot holds rows that are still only in the WAL file."""
+    import sqlite3
+    db_path = str(tmp_path / 'live.db')
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA wal_autocheckpoint=0") # Keep the new pages out of the main file
+    writer.execute("CREATE TABLE files (id INTEGER PRIMARY KEY)")
+    writer.executemany("INSERT INTO files DEFAULT VALUES", [()] * 50)
+    writer.commit()
+    try:
+        version_bumper.snapshot_database(db_path, str(tmp_path / 'snapshot.db'))
+    finally:
+        writer.close()
+    conn = sqlite3.connect(tmp_path / 'snapshot.db')
+    assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 50
+    conn.close()
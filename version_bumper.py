@@ -7,6 +7,7 @@ Usage:
 """
 
 import argparse
+import sqlite3
 import subprocess
 import re
 import sys
@@ -19,6 +20,21 @@ VERSION_FILE = "VERSION"
 CHANGELOG_FILE = "CHANGELOG.md"
 DB_FILENAME = "file_index.db"
 DB_ZIP_FILENAME = "file_index.zip"
+DB_SNAPSHOT_FILENAME = "file_index.db.snapshot" # Temporary consistent copy that gets zipped
+
+def snapshot_database(db_path, snapshot_path):
+    """Copies db_path to snapshot_path with SQLite's online backup API.
+    Unlike copying the file, this includes commits still in the WAL file and can't
+    be torn by a checkpoint running at the same time."""
+    source = sqlite3.connect(db_path)
+    try:
+        dest = sqlite3.connect(snapshot_path)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+    finally:
+        source.close()
 
 def run_command(command, capture_output=False, check=True, shell=False):
     """Helper function to run a shell command."""
@@ -210,13 +226,17 @@ def main():
     if os.path.exists(DB_FILENAME):
         print(f"Found {DB_FILENAME}. Creating zip archive {DB_ZIP_FILENAME}...")
         try:
+            snapshot_database(DB_FILENAME, DB_SNAPSHOT_FILENAME)
             with zipfile.ZipFile(DB_ZIP_FILENAME, 'w', zipfile.ZIP_DEFLATED) as zf:
-                zf.write(DB_FILENAME, arcname=DB_FILENAME) # Store with original name inside zip
+                zf.write(DB_SNAPSHOT_FILENAME, arcname=DB_FILENAME) # Store with original name inside zip
             print(f"Successfully created {DB_ZIP_FILENAME}.")
             files_to_add.append(DB_ZIP_FILENAME)
         except Exception as e:
             print(f"Warning: Failed to create {DB_ZIP_FILENAME} from {DB_FILENAME}: {e}", file=sys.stderr)
             print(f"Warning: Proceeding to commit without {DB_ZIP_FILENAME}.", file=sys.stderr)
+        finally:
+            if os.path.exists(DB_SNAPSHOT_FILENAME):
+                os.remove(DB_SNAPSHOT_FILENAME)
     else:
         print(f"Warning: Database file {DB_FILENAME} not found in root directory.", file=sys.stderr)
         print(f"Warning: Cannot create {DB_ZIP_FILENAME}. Proceeding to commit without it.", file=sys.stderr)